@@ -1,20 +1,49 @@
 #!/usr/bin/env python3
 
+import os
+import sys
+
 import connexion
-from flask import current_app
-from repo_harvester_server.helper.RepositoryHarvester import CatalogMetadataHarvester
-#from repo_harvester_server import encoder
+from connexion.exceptions import ResolverError
+from connexion.resolver import Resolver
+from repo_harvester_server import encoder
 
-def create_app():
-    app = connexion.App(__name__, specification_dir='swagger/')
-    app.add_api('swagger.yaml', arguments={'title': 'RepoInfoHarvester'}, pythonic_params=True)
-    foo = 'bar' # needs to be declared and initialized here
-    with app.app.app_context():
-        current_app.termtagger = CatalogMetadataHarvester('https://www.pangaea.de')
+def _setup_app(app, warm_up=None, resolver=None):
+    # No harvest or network work at start up; heavy parsers are imported on first use.
+    # responses are serialized with the orjson backed encoder.dumps() if orjson is installed
+    options = {'resolver': resolver} if resolver is not None else {}
+    app.add_api('swagger.yaml', arguments={'title': 'RepoInfoHarvester'}, pythonic_params=True,
+                jsonifier=encoder.get_jsonifier(), **options)
+    if warm_up is None:
+        warm_up = os.environ.get('REPO_HARVESTER_WARM_UP', '').lower() in ('1', 'true', 'yes')
+    if warm_up:
+        # pre-initialize parser plugins and the JSON-LD context cache before serving traffic
+        from repo_harvester_server.helper.MetadataHelper import warm_up as warm_up_parsers
+        warm_up_parsers()
     return app
 
+def create_app(warm_up=None):
+    app = connexion.App(__name__, specification_dir='swagger/')
+    # jsonify() and Flask error handlers use the same encoder
+    app.app.json = encoder.JSONProvider(app.app)
+    return _setup_app(app, warm_up)
+
+class AsyncResolver(Resolver):
+    """Resolves operations to the coroutine <operationId>_async of their controller if it has one"""
+    def resolve_function_from_operation_id(self, operation_id):
+        try:
+            return super().resolve_function_from_operation_id(operation_id + '_async')
+        except ResolverError:
+            return super().resolve_function_from_operation_id(operation_id)
+
+def create_async_app(warm_up=None):
+    # ASGI app: get_repo_info_async awaits the async harvest pipeline, so a waiting harvest holds no thread
+    return _setup_app(connexion.AsyncApp(__name__, specification_dir='swagger/'), warm_up, AsyncResolver())
+
 def main():
-    app = create_app()
+    use_async = '--async' in sys.argv[1:] or \
+        os.environ.get('REPO_HARVESTER_ASYNC', '').lower() in ('1', 'true', 'yes')
+    app = create_async_app() if use_async else create_app()
     # app.app.jso
     app.run(port=8080)
 
@@ -1,8 +1,76 @@
+import asyncio
+import os
+import threading
+import weakref
+
 import connexion
 import six
 
-from swagger_server.models.repository_info import RepositoryInfo  # noqa: E501
-from swagger_server import util
+from repo_harvester_server.models.repository_info import RepositoryInfo  # noqa: E501
+from repo_harvester_server import util
+
+# path of the SQLite database of the SharedCache used by all workers of the node, no shared cache if unset
+CACHE_PATH_ENV = 'REPO_HARVESTER_CACHE'
+_shared_state_lock = threading.Lock()
+# SharedCache, RedirectMemo and NegotiationMemo of all requests of this process, see get_shared_state()
+_shared_state = None
+
+# FetchHelper of the sync app, its negative cache and circuit breaker are shared by all requests
+_fetcher_lock = threading.Lock()
+_fetcher = None
+
+# one AsyncFetchHelper per event loop, its connection pool and per host limits are shared by all requests
+# served by that loop and must not outlive it
+_async_fetchers = weakref.WeakKeyDictionary()
+
+
+def get_async_fetcher():
+    loop = asyncio.get_running_loop()
+    fetcher = _async_fetchers.get(loop)
+    if fetcher is None:
+        from repo_harvester_server.helper.AsyncFetchHelper import AsyncFetchHelper
+        from repo_harvester_server.helper.CircuitBreaker import CircuitBreaker, NegativeCache
+        fetcher = _async_fetchers[loop] = AsyncFetchHelper(negative_cache=NegativeCache(),
+                                                           circuit_breaker=CircuitBreaker(),
+                                                           cache=get_shared_state()['cache'])
+    return fetcher
+
+
+def get_shared_state():
+    """
+    Returns the SharedCache configured by REPO_HARVESTER_CACHE (or None) together with the redirect
+    and negotiation memos backed by it, shared by the sync and the async app.
+    """
+    global _shared_state
+    with _shared_state_lock:
+        if _shared_state is None:
+            from repo_harvester_server.helper.NegotiationHelper import NegotiationMemo
+            from repo_harvester_server.helper.SharedCache import SharedCache
+            from repo_harvester_server.helper.UrlHelper import RedirectMemo
+            cache_path = os.environ.get(CACHE_PATH_ENV)
+            cache = SharedCache(cache_path) if cache_path else None
+            _shared_state = {'cache': cache, 'redirect_memo': RedirectMemo(cache=cache),
+                             'negotiation_memo': NegotiationMemo(cache=cache)}
+        return _shared_state
+
+
+def get_fetcher():
+    global _fetcher
+    cache = get_shared_state()['cache']
+    with _fetcher_lock:
+        if _fetcher is None:
+            from repo_harvester_server.helper.CircuitBreaker import CircuitBreaker, NegativeCache
+            from repo_harvester_server.helper.FetchHelper import FetchHelper
+            _fetcher = FetchHelper(negative_cache=NegativeCache(), circuit_breaker=CircuitBreaker(), cache=cache)
+        return _fetcher
+
+
+def _get_repository_info(harvester):
+    metadata = dict(harvester.metadata)
+    services = {}
+    for index, service in enumerate(metadata.pop('services', None) or []):
+        services[service.get('endpoint_uri') or str(index)] = service
+    return RepositoryInfo(repo_uri=str(harvester.catalog_url), metadata=metadata, services=services).to_json_dict()
 
 
 def get_repo_info(url):  # noqa: E501
@@ -15,4 +83,23 @@ def get_repo_info(url):  # noqa: E501
 
     :rtype: RepositoryInfo
     """
-    return 'do some magic!'
+    from repo_harvester_server.helper.RepositoryHarvester import CatalogMetadataHarvester
+    harvester = CatalogMetadataHarvester(url, fetcher=get_fetcher(), **get_shared_state())
+    harvester.harvest()
+    return _get_repository_info(harvester)
+
+
+async def get_repo_info_async(url):  # noqa: E501
+    """get_repo_info of the async app, see create_async_app()
+
+    Return the repo info as a dictionary # noqa: E501
+
+    :param url: A repository URL
+    :type url: str
+
+    :rtype: RepositoryInfo
+    """
+    from repo_harvester_server.helper.RepositoryHarvester import AsyncCatalogMetadataHarvester
+    harvester = AsyncCatalogMetadataHarvester(url, async_fetcher=get_async_fetcher(), **get_shared_state())
+    await harvester.harvest_async()
+    return _get_repository_info(harvester)
@@ -1,20 +1,85 @@
 from connexion import FlaskApp
-import six
-from flask import json
+import json as std_json
+try:
+    from flask.json import JSONEncoder as _BaseJSONEncoder
+except ImportError:
+    # Flask >= 2.3 dropped its JSONEncoder
+    _BaseJSONEncoder = std_json.JSONEncoder
+try:
+    from flask.json.provider import DefaultJSONProvider as _DefaultJSONProvider
+except ImportError:
+    # Flask < 2.2 has no JSON providers
+    _DefaultJSONProvider = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from repo_harvester_server.models.base_model_ import Model
 
 
-class JSONEncoder(json.JSONEncoder):
+class JSONEncoder(_BaseJSONEncoder):
     include_nulls = False
 
     def default(self, o):
         if isinstance(o, Model):
-            dikt = {}
-            for attr, _ in six.iteritems(o.swagger_types):
-                value = getattr(o, attr)
-                if value is None and not self.include_nulls:
-                    continue
-                attr = o.attribute_map[attr]
-                dikt[attr] = value
-            return dikt
+            return o.to_json_dict(self.include_nulls)
         return super(JSONEncoder, self).default(o)
+
+
+def _orjson_default(o):
+    if isinstance(o, Model):
+        return o.to_json_dict(JSONEncoder.include_nulls)
+    raise TypeError
+
+
+def dumps(obj, **kwargs):
+    """
+    Serializes models and plain values to a JSON string, using orjson if it is installed.
+    Formatting options (indent, sort_keys...) are only applied by the json module fallback.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_orjson_default).decode('utf-8')
+        except TypeError:
+            # e.g. non str dict keys or integers beyond 64 bit
+            pass
+    default = kwargs.pop('default', None)
+    if default is not None:
+        def fallback_default(o):
+            if isinstance(o, Model):
+                return o.to_json_dict(JSONEncoder.include_nulls)
+            return default(o)
+        return std_json.dumps(obj, default=fallback_default, **kwargs)
+    return std_json.dumps(obj, cls=JSONEncoder, **kwargs)
+
+
+def loads(s, **kwargs):
+    if orjson is not None and not kwargs:
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            pass
+    return std_json.loads(s, **kwargs)
+
+
+class _JsonModule:
+    """json module interface over dumps() and loads() for connexion's Jsonifier"""
+    dumps = staticmethod(dumps)
+    loads = staticmethod(loads)
+    JSONDecodeError = std_json.JSONDecodeError
+
+
+def get_jsonifier():
+    """Jsonifier serializing the API responses of both app flavours with dumps()"""
+    from connexion.jsonifier import Jsonifier
+    return Jsonifier(_JsonModule)
+
+
+if _DefaultJSONProvider is not None:
+    class JSONProvider(_DefaultJSONProvider):
+        """Flask JSON provider using dumps() and loads(), see FlaskApp.app.json"""
+        def dumps(self, obj, **kwargs):
+            return dumps(obj, **kwargs)
+
+        def loads(self, s, **kwargs):
+            return loads(s, **kwargs)
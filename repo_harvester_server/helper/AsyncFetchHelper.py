@@ -0,0 +1,208 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+from repo_harvester_server.helper.FetchHelper import BufferedResponse
+
+
+def _get_accept(headers):
+    return (headers or {}).get('Accept')
+
+
+class AsyncFetchHelper:
+    """
+    Non blocking counterpart of FetchHelper used by the async harvest pipeline.
+    Documents are read completely into BufferedResponses, a waiting request holds no thread so a
+    single worker can keep thousands of fetches in flight. Requests to one host are limited to
+    max_per_host at a time with min_delay seconds between them; with a HostScheduler robots.txt
+    is honoured. A NegativeCache and a CircuitBreaker let requests to dead URLs and hosts fail fast.
+    With a SharedCache successful documents are shared by all workers of a node, sync ones included.
+    """
+    def __init__(self, negative_cache=None, circuit_breaker=None, scheduler=None, timeout=(10, 60),
+                 max_connections=1000, max_per_host=2, min_delay=0.0, cache=None, cache_ttl=3600):
+        self.negative_cache = negative_cache
+        self.circuit_breaker = circuit_breaker
+        # optional HostScheduler, only its robots.txt cache is used here
+        self.scheduler = scheduler
+        # (connect, read) timeout in seconds
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.min_delay = min_delay
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self._client = None
+        self._hosts = {}
+
+    def _get_client(self):
+        # httpx is imported on first use to keep server start up fast
+        if self._client is None:
+            import httpx
+            connect_timeout, read_timeout = self.timeout
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=min(self.max_connections, 100)))
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_host_state(self, url):
+        host = urlparse(str(url)).netloc.lower()
+        state = self._hosts.get(host)
+        if state is None:
+            # [semaphore, earliest start of the next request]
+            state = self._hosts[host] = [asyncio.Semaphore(self.max_per_host), 0.0]
+        return state
+
+    async def get(self, url, headers=None, budget=None):
+        """
+        Returns a BufferedResponse or None if the document could not be retrieved. With a
+        HarvestBudget only the first max_document_bytes of larger documents are read, the
+        response is marked truncated and the budget records it.
+        """
+        if self.cache is not None:
+            return await self._get_cached(url, headers, budget)
+        return await self._get_live(url, headers, budget)
+
+    async def _get_cached(self, url, headers=None, budget=None):
+        # same entries as FetchHelper._get_cached(), only one worker of the node fetches a missing document
+        key = 'document:{}|{}'.format(url, _get_accept(headers) or '')
+        fetched = []
+
+        async def fetch_document():
+            response = await self._get_live(url, headers, budget)
+            fetched.append(response)
+            if response is None or response.status_code != 200 or response.truncated:
+                return None
+            return response.to_bytes()
+
+        data = await self.cache.get_or_compute_async(key, fetch_document, self.cache_ttl)
+        if fetched:
+            return fetched[0]
+        if data is None:
+            return await self._get_live(url, headers, budget)
+        response = BufferedResponse.from_bytes(data)
+        if budget is not None and budget.max_document_bytes is not None:
+            if len(response.content) > budget.max_document_bytes:
+                budget.mark_truncated('max_document_bytes', budget.max_document_bytes, url)
+                response._content = response.content[:budget.max_document_bytes]
+                response.truncated = True
+        return response
+
+    async def _get_live(self, url, headers=None, budget=None):
+        if self.negative_cache is not None and self.negative_cache.is_blocked(url):
+            print('Skipping recently failed URL: ', url)
+            return None
+        if self.scheduler is not None and self.scheduler.respect_robots:
+            if not await asyncio.to_thread(self.scheduler.can_fetch, url):
+                print('Fetch disallowed by robots.txt: ', url)
+                return None
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow(url):
+            print('Circuit open for host of: ', url)
+            return None
+        try:
+            return await self._fetch(url, headers, budget)
+        finally:
+            if self.circuit_breaker is not None:
+                # a half open probe which ended without success or failure must not block the host
+                self.circuit_breaker.release(url)
+
+    async def _fetch(self, url, headers=None, budget=None):
+        import httpx
+        state = self._get_host_state(url)
+        try:
+            async with state[0]:
+                delay = state[1] - time.monotonic()
+                state[1] = max(state[1], time.monotonic()) + self.min_delay
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                response = await self._send(url, headers, budget)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            print('Fetch Error: ', url, e)
+            self._record_failure(url)
+            return None
+        if response is None:
+            return None
+        if response.status_code == 429:
+            # the host asked to come back later, this is neither a result nor a failure
+            print('Rate limited by host: ', url)
+            return None
+        if response.status_code >= 500:
+            print('Server Error: ', response.status_code, url)
+            self._record_failure(url)
+            return None
+        self._record_success(url)
+        return response
+
+    async def _send(self, url, headers=None, budget=None):
+        max_bytes = budget.max_document_bytes if budget is not None else None
+        async with self._get_client().stream('GET', url, headers=headers) as response:
+            chunks = []
+            size = 0
+            truncated = False
+            async for chunk in response.aiter_bytes(65536):
+                if max_bytes is not None and size + len(chunk) > max_bytes:
+                    # HTML and linksets can be parsed partially, see PrefetchedFetcher.get()
+                    budget.mark_truncated('max_document_bytes', max_bytes, url)
+                    chunks.append(chunk[:max_bytes - size])
+                    truncated = True
+                    break
+                size += len(chunk)
+                chunks.append(chunk)
+            buffered = BufferedResponse(str(response.url), response.status_code, dict(response.headers),
+                                        response.encoding if response.charset_encoding else None, b''.join(chunks))
+            buffered.truncated = truncated
+            buffered.history = [BufferedResponse(str(hop.url), hop.status_code, dict(hop.headers))
+                                for hop in response.history]
+            return buffered
+
+    def _record_failure(self, url):
+        if self.negative_cache is not None:
+            self.negative_cache.record_failure(url)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_failure(url)
+
+    def _record_success(self, url):
+        if self.negative_cache is not None:
+            self.negative_cache.record_success(url)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success(url)
+
+
+class PrefetchedFetcher:
+    """
+    FetchHelper stand-in for the synchronous extraction helpers which serves documents fetched
+    beforehand by an AsyncFetchHelper. Documents which have not been fetched yet are answered
+    with None and collected in pending, so the async harvest can fetch them concurrently and
+    run the extraction again.
+    """
+    def __init__(self, documents=None):
+        self.document_store = None
+        self.replay = False
+        self.scheduler = None
+        # (url, Accept header) -> BufferedResponse or None for documents which could not be fetched
+        self.documents = documents if documents is not None else {}
+        # (url, Accept header) -> request headers
+        self.pending = {}
+
+    def is_pending(self, url):
+        return any(key[0] == url for key in self.pending)
+
+    def get(self, url, headers=None, stream=False, budget=None, truncate=False):
+        key = (url, _get_accept(headers))
+        if key not in self.documents:
+            self.pending[key] = headers
+            return None
+        response = self.documents[key]
+        if response is not None and response.truncated and not truncate:
+            # like FetchHelper, oversized documents are only handed out cut off when asked for
+            return None
+        if response is not None:
+            # every extraction pass reads the body from the start
+            response.close()
+        return response
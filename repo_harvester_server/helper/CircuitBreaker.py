@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class NegativeCache:
+    """
+    Remembers failed URLs (timeouts, connection and DNS errors, 5xx) and blocks them for an
+    exponentially growing backoff period.
+    """
+    def __init__(self, base_backoff=60.0, max_backoff=86400.0, max_entries=100000):
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # url -> (number of consecutive failures, retry not before)
+        self._entries = OrderedDict()
+
+    def is_blocked(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def record_failure(self, url):
+        with self._lock:
+            failures = self._entries.pop(url, (0, 0.0))[0] + 1
+            backoff = min(self.base_backoff * 2 ** (failures - 1), self.max_backoff)
+            self._entries[url] = (failures, time.monotonic() + backoff)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return backoff
+
+    def record_success(self, url):
+        with self._lock:
+            self._entries.pop(url, None)
+
+
+class CircuitBreaker:
+    """
+    Per host circuit breaker: after failure_threshold consecutive failures the host is opened
+    and requests fail fast. Once reset_timeout has passed a single probe request is let through
+    (half open); its success closes the circuit, its failure opens it again. A probe without
+    outcome has to be released, see release().
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=300.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        # host -> [state, consecutive failures, opened at]
+        self._hosts = {}
+
+    def get_host(self, url):
+        return urlparse(str(url)).netloc.lower()
+
+    def get_state(self, url):
+        with self._lock:
+            entry = self._hosts.get(self.get_host(url))
+            return entry[0] if entry else self.CLOSED
+
+    def allow(self, url):
+        with self._lock:
+            entry = self._hosts.get(self.get_host(url))
+            if entry is None or entry[0] == self.CLOSED:
+                return True
+            if entry[0] == self.OPEN and time.monotonic() - entry[2] >= self.reset_timeout:
+                # let exactly one probe through
+                entry[0] = self.HALF_OPEN
+                return True
+            return False
+
+    def record_failure(self, url):
+        with self._lock:
+            host = self.get_host(url)
+            entry = self._hosts.setdefault(host, [self.CLOSED, 0, 0.0])
+            entry[1] += 1
+            if entry[0] == self.HALF_OPEN or entry[1] >= self.failure_threshold:
+                entry[0] = self.OPEN
+                entry[2] = time.monotonic()
+
+    def record_success(self, url):
+        with self._lock:
+            self._hosts.pop(self.get_host(url), None)
+
+    def release(self, url):
+        """
+        Ends a request without outcome, e.g. disallowed, deferred or dropped before the host
+        answered. A half open host goes back to open so that the next request probes it again.
+        """
+        with self._lock:
+            entry = self._hosts.get(self.get_host(url))
+            if entry is not None and entry[0] == self.HALF_OPEN:
+                entry[0] = self.OPEN
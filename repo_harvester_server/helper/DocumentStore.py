@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+
+class DocumentStore:
+    """
+    Content-addressed store for raw fetched documents (HTML, headers, linksets, JSON-LD).
+    Each body is stored once under its sha256 digest, a small index record maps every
+    fetched URL to its body, status and response headers.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = os.path.abspath(store_dir)
+        self.objects_dir = os.path.join(self.store_dir, 'objects')
+        self.index_dir = os.path.join(self.store_dir, 'index')
+        self.catalogs_dir = os.path.join(self.store_dir, 'catalogs')
+        for directory in (self.objects_dir, self.index_dir, self.catalogs_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _url_key(self, url):
+        return hashlib.sha256(str(url).encode('utf-8')).hexdigest()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:] + '.gz')
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put_chunks(self, chunks):
+        """
+        Stores an iterable of byte chunks without holding the whole body in memory
+        and returns its sha256 digest.
+        """
+        sha = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                for chunk in chunks:
+                    if chunk:
+                        sha.update(chunk)
+                        gz.write(chunk)
+            digest = sha.hexdigest()
+            path = self._object_path(digest)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def put(self, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        return self.put_chunks([content])
+
+    def open(self, digest):
+        return gzip.open(self._object_path(digest), 'rb')
+
+    def get(self, digest):
+        with self.open(digest) as f:
+            return f.read()
+
+    def _record_key(self, url, accept=None):
+        # one URL can be stored in several content negotiated representations
+        if accept:
+            return self._url_key('{}\n{}'.format(url, accept))
+        return self._url_key(url)
+
+    def record(self, url, digest, headers=None, status_code=None, final_url=None, encoding=None, accept=None):
+        record = {
+            'url': url,
+            'digest': digest,
+            'headers': dict(headers or {}),
+            'status_code': status_code,
+            'final_url': final_url or url,
+            'encoding': encoding,
+            'accept': accept,
+        }
+        self._write_atomic(os.path.join(self.index_dir, self._record_key(url, accept) + '.json'), json.dumps(record))
+        return record
+
+    def lookup(self, url, accept=None):
+        """
+        Returns the record of url fetched with the given Accept header (None for no Accept header).
+        """
+        try:
+            with open(os.path.join(self.index_dir, self._record_key(url, accept) + '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def add_catalog(self, url, accept=None):
+        """
+        Registers a harvested catalog together with the Accept header its landing page was requested with.
+        """
+        path = os.path.join(self.catalogs_dir, self._url_key(url))
+        if not os.path.exists(path):
+            self._write_atomic(path, json.dumps({'url': str(url), 'accept': accept}))
+
+    def _read_catalog(self, path):
+        with open(path, encoding='utf-8') as f:
+            content = f.read()
+        if content.startswith('{'):
+            return json.loads(content)
+        # stores written before the Accept header was kept
+        return {'url': content, 'accept': None}
+
+    def get_catalog(self, url):
+        try:
+            return self._read_catalog(os.path.join(self.catalogs_dir, self._url_key(url)))
+        except FileNotFoundError:
+            return None
+
+    def iter_catalogs(self):
+        """
+        Streams the catalog URLs which have been harvested into this store.
+        """
+        with os.scandir(self.catalogs_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    yield self._read_catalog(entry.path)['url']
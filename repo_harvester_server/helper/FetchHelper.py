@@ -0,0 +1,301 @@
+import io
+import json
+import re
+
+from repo_harvester_server.helper.HarvestBudget import BudgetExceeded
+
+
+class BufferedResponse:
+    """
+    Minimal stand-in for requests.Response holding an already read body.
+    """
+    def __init__(self, url, status_code, headers=None, encoding=None, content=None):
+        from requests.structures import CaseInsensitiveDict
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.encoding = encoding
+        self._content = content
+        self._raw = None
+        # redirect hops, like requests.Response.history
+        self.history = []
+        # True if the body has been cut off at the max_document_bytes of a HarvestBudget
+        self.truncated = False
+
+    @property
+    def ok(self):
+        return self.status_code is not None and self.status_code < 400
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = io.BytesIO(self.content)
+        return self._raw
+
+    @property
+    def content(self):
+        return self._content
+
+    @property
+    def text(self):
+        encoding = self.encoding
+        if not encoding:
+            charset = re.search(r'charset=([\w-]+)', self.headers.get('Content-Type', ''))
+            encoding = charset.group(1) if charset else 'utf-8'
+        return self.content.decode(encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=65536):
+        content = self.content
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def close(self):
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+
+    def to_bytes(self):
+        """Serializes status, headers and body for a SharedCache entry"""
+        head = {'url': self.url, 'status_code': self.status_code, 'headers': dict(self.headers),
+                'encoding': self.encoding, 'history': [[hop.url, hop.status_code] for hop in self.history]}
+        return json.dumps(head).encode('utf-8') + b'\n' + self.content
+
+    @classmethod
+    def from_bytes(cls, data):
+        head, _, content = bytes(data).partition(b'\n')
+        head = json.loads(head)
+        response = cls(head['url'], head['status_code'], head['headers'], head['encoding'], content)
+        response.history = [cls(url, status_code) for url, status_code in head.get('history', [])]
+        return response
+
+
+class StoredResponse(BufferedResponse):
+    """
+    Minimal stand-in for requests.Response which serves a body recorded in a DocumentStore.
+    """
+    def __init__(self, document_store, record):
+        super().__init__(record.get('final_url') or record.get('url'), record.get('status_code'),
+                         record.get('headers'), record.get('encoding'))
+        self.document_store = document_store
+        self.record = record
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = self.document_store.open(self.record['digest'])
+        return self._raw
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.document_store.get(self.record['digest'])
+        return self._content
+
+    def iter_content(self, chunk_size=65536):
+        with self.document_store.open(self.record['digest']) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class FetchHelper:
+    """
+    Single entry point for all HTTP GETs of the harvester.
+    With a DocumentStore every fetched document is recorded, with replay=True documents
+    are served from the store only and no outbound request is made.
+    With a HostScheduler requests are throttled per host and robots.txt is honoured.
+    A NegativeCache and a CircuitBreaker let requests to dead URLs and hosts fail fast.
+    With a SharedCache successful non streamed documents are shared by all workers of a node.
+    """
+    def __init__(self, document_store=None, replay=False, scheduler=None, negative_cache=None,
+                 circuit_breaker=None, timeout=(10, 60), cache=None, cache_ttl=3600):
+        self.document_store = document_store
+        self.replay = replay
+        self.scheduler = scheduler
+        self.negative_cache = negative_cache
+        self.circuit_breaker = circuit_breaker
+        # (connect, read) timeout in seconds passed to requests
+        self.timeout = timeout
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        if replay and document_store is None:
+            raise ValueError('Replay mode requires a document store')
+
+    def get(self, url, headers=None, stream=False, budget=None, truncate=False):
+        """
+        Returns a response or None if the document could not be retrieved. With a HarvestBudget
+        documents larger than its max_document_bytes are dropped (or cut off while streaming)
+        and recorded as truncated. With truncate=True their first max_document_bytes are
+        returned instead, for documents which can be parsed partially like HTML and linksets.
+        """
+        if self.replay:
+            record = self.document_store.lookup(url, (headers or {}).get('Accept'))
+            if record is None:
+                print('No stored document for: ', url)
+                return None
+            return StoredResponse(self.document_store, record)
+        if self.cache is not None and not stream:
+            return self._get_cached(url, headers, budget, truncate)
+        return self._get_live(url, headers, stream, budget, truncate)
+
+    def _get_cached(self, url, headers=None, budget=None, truncate=False):
+        # only one worker of the node fetches a missing document, the others wait for it
+        key = 'document:{}|{}'.format(url, (headers or {}).get('Accept', ''))
+        fetched = []
+
+        def fetch_document():
+            response = self._get_live(url, headers, False, budget, truncate)
+            fetched.append(response)
+            if response is None or response.status_code != 200 or getattr(response, 'truncated', False):
+                return None
+            buffered = BufferedResponse(response.url, response.status_code, response.headers,
+                                        response.encoding, response.content)
+            buffered.history = response.history
+            return buffered.to_bytes()
+
+        data = self.cache.get_or_compute(key, fetch_document, self.cache_ttl)
+        if fetched:
+            return fetched[0]
+        if data is None:
+            return self._get_live(url, headers, False, budget, truncate)
+        response = BufferedResponse.from_bytes(data)
+        if budget is not None and budget.max_document_bytes is not None:
+            if len(response.content) > budget.max_document_bytes:
+                budget.mark_truncated('max_document_bytes', budget.max_document_bytes, url)
+                if not truncate:
+                    return None
+                response._content = response.content[:budget.max_document_bytes]
+                response.truncated = True
+        if self.document_store is not None:
+            # filled by another worker: record it anyway, replays of this harvest need it
+            digest = self.document_store.put(response.content)
+            record = self.document_store.record(url, digest, response.headers, response.status_code,
+                                                response.url, response.encoding,
+                                                (headers or {}).get('Accept'))
+            stored = StoredResponse(self.document_store, record)
+            stored.history = response.history
+            stored.truncated = response.truncated
+            return stored
+        return response
+
+    def _get_live(self, url, headers=None, stream=False, budget=None, truncate=False):
+        if self.negative_cache is not None and self.negative_cache.is_blocked(url):
+            print('Skipping recently failed URL: ', url)
+            return None
+        if self.scheduler is not None and not self.scheduler.can_fetch(url):
+            print('Fetch disallowed by robots.txt: ', url)
+            return None
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow(url):
+            print('Circuit open for host of: ', url)
+            return None
+        try:
+            return self._fetch(url, headers, stream, budget, truncate)
+        finally:
+            if self.circuit_breaker is not None:
+                # a half open probe which ended without success or failure must not block the host
+                self.circuit_breaker.release(url)
+
+    def _fetch(self, url, headers=None, stream=False, budget=None, truncate=False):
+        # requests is imported on first use to keep server start up fast
+        import requests
+        max_bytes = budget.max_document_bytes if budget is not None else None
+        try:
+            # a size limit needs the body to be read incrementally
+            response = self._request(url, headers, stream or max_bytes is not None)
+        except requests.RequestException as e:
+            print('Fetch Error: ', url, e)
+            self._record_failure(url)
+            return None
+        if response is None:
+            return None
+        if response.status_code == 429:
+            print('Rate limited by host: ', url)
+            response.close()
+            return None
+        if response.status_code >= 500:
+            print('Server Error: ', response.status_code, url)
+            response.close()
+            self._record_failure(url)
+            return None
+        self._record_success(url)
+        if stream or max_bytes is not None:
+            # let response.raw yield decompressed bytes for incremental parsers
+            response.raw.decode_content = True
+        if max_bytes is not None:
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes and not truncate:
+                budget.mark_truncated('max_document_bytes', max_bytes, url)
+                response.close()
+                return None
+        if self.document_store is not None:
+            chunks = response.iter_content(65536)
+            if max_bytes is not None:
+                chunks = budget.limit_chunks(chunks, url, truncate)
+            try:
+                digest = self.document_store.put_chunks(chunks)
+                record = self.document_store.record(url, digest, response.headers, response.status_code,
+                                                    response.url, response.encoding,
+                                                    (headers or {}).get('Accept'))
+            except BudgetExceeded:
+                return None
+            finally:
+                response.close()
+            stored = StoredResponse(self.document_store, record)
+            # the redirect chain tells the harvester whether the final URL is canonical
+            stored.history = response.history
+            stored.truncated = max_bytes is not None and budget.is_document_truncated(url)
+            return stored
+        response.truncated = False
+        if max_bytes is not None:
+            if stream:
+                # a streamed body is cut off while it is read
+                response.raw = budget.limit_reader(response.raw, url, truncate)
+            else:
+                try:
+                    response._content = b''.join(budget.limit_chunks(response.iter_content(65536), url,
+                                                                      truncate))
+                except BudgetExceeded:
+                    response.close()
+                    return None
+                response._content_consumed = True
+                response.truncated = budget.is_document_truncated(url)
+        return response
+
+    def _record_failure(self, url):
+        if self.negative_cache is not None:
+            self.negative_cache.record_failure(url)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_failure(url)
+
+    def _record_success(self, url):
+        if self.negative_cache is not None:
+            self.negative_cache.record_success(url)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success(url)
+
+    def _send(self, url, headers=None, stream=False):
+        import requests
+        return requests.get(url, headers=headers, stream=stream, timeout=self.timeout)
+
+    def _request(self, url, headers=None, stream=False):
+        if self.scheduler is None:
+            return self._send(url, headers, stream)
+        with self.scheduler.slot(url):
+            response = self._send(url, headers, stream)
+        if response.status_code in (429, 503) and response.headers.get('Retry-After'):
+            delay = self.scheduler.defer(url, response.headers.get('Retry-After'))
+            if delay is not None and delay <= self.scheduler.max_retry_after:
+                response.close()
+                with self.scheduler.slot(url):
+                    response = self._send(url, headers, stream)
+            if response.status_code in (429, 503):
+                # the host asked to come back later, this is neither a result nor a failure
+                print('Deferred by host: ', response.status_code, url)
+                response.close()
+                return None
+        return response
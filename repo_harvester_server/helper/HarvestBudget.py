@@ -0,0 +1,156 @@
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class BudgetExceeded(Exception):
+    """Raised inside a fetch or parse when a HarvestBudget limit is hit."""
+
+
+_bounded_store_class = None
+# tracemalloc is process wide, tracked stages of concurrent harvests take turns
+_trace_lock = threading.RLock()
+
+
+def _get_bounded_store_class():
+    # rdflib is imported on first use, see MetadataHelper.warm_up()
+    global _bounded_store_class
+    if _bounded_store_class is None:
+        from rdflib.plugins.stores.memory import Memory
+
+        class BoundedMemory(Memory):
+            """
+            rdflib memory store which refuses triples beyond max_triples. The limit is meant for
+            parsing, set max_triples to None afterwards to allow rewriting the graph.
+            """
+            max_triples = None
+            triple_count = 0
+
+            def add(self, triple, context, quoted=False):
+                if self.max_triples is not None and self.triple_count >= self.max_triples:
+                    raise BudgetExceeded('More than {} triples'.format(self.max_triples))
+                super().add(triple, context, quoted)
+                self.triple_count += 1
+
+        _bounded_store_class = BoundedMemory
+    return _bounded_store_class
+
+
+class HarvestBudget:
+    """
+    Memory and size limits of a single harvest. When a limit is hit the harvest continues with
+    what has been read so far and the limit is recorded in truncated, which ends up in the
+    harvested metadata. With trace_memory=True the peak memory of every stage is measured
+    with tracemalloc and collected in memory_report to tune the limits.
+    """
+    def __init__(self, max_document_bytes=50 * 1024 * 1024, max_graph_triples=500000,
+                 max_linkset_links=10000, trace_memory=False):
+        self.max_document_bytes = max_document_bytes
+        self.max_graph_triples = max_graph_triples
+        self.max_linkset_links = max_linkset_links
+        self.trace_memory = trace_memory
+        self.truncated = []
+        # stage -> peak traced memory in bytes
+        self.memory_report = {}
+
+    def mark_truncated(self, limit, value, url=None):
+        marker = {'limit': limit, 'value': value}
+        if url:
+            marker['url'] = url
+        if marker not in self.truncated:
+            print('Harvest budget exceeded: ', marker)
+            self.truncated.append(marker)
+
+    def limit_chunks(self, chunks, url=None, truncate=False):
+        """
+        Passes byte chunks through and raises BudgetExceeded once more than
+        max_document_bytes have been read. With truncate=True the chunks end after
+        max_document_bytes instead.
+        """
+        size = 0
+        for chunk in chunks:
+            if self.max_document_bytes is not None and size + len(chunk) > self.max_document_bytes:
+                self.mark_truncated('max_document_bytes', self.max_document_bytes, url)
+                if truncate:
+                    yield chunk[:self.max_document_bytes - size]
+                    return
+                raise BudgetExceeded('Document larger than {} bytes'.format(self.max_document_bytes))
+            size += len(chunk)
+            yield chunk
+
+    def limit_reader(self, fileobj, url=None, truncate=False):
+        return _LimitedReader(fileobj, self, url, truncate)
+
+    def is_document_truncated(self, url):
+        return {'limit': 'max_document_bytes', 'value': self.max_document_bytes, 'url': url} in self.truncated
+
+    def new_graph(self):
+        import rdflib
+        if self.max_graph_triples is None:
+            return rdflib.ConjunctiveGraph()
+        store = _get_bounded_store_class()()
+        store.max_triples = self.max_graph_triples
+        return rdflib.ConjunctiveGraph(store=store)
+
+    @contextmanager
+    def track(self, stage):
+        """
+        Records the peak memory allocated while the (not nested) stage runs. tracemalloc is
+        process wide: tracked stages of concurrent harvests are serialized and the peak also
+        contains allocations of other threads running meanwhile, so use it to tune the limits
+        on single harvests. Only parsing stages are tracked, a stage must not wait for the
+        network while it holds the other harvests back.
+        """
+        if not self.trace_memory:
+            yield
+            return
+        with _trace_lock:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                self.memory_report[stage] = max(self.memory_report.get(stage, 0), peak)
+                if started:
+                    tracemalloc.stop()
+
+
+class _LimitedReader:
+    """
+    Binary file object wrapper raising BudgetExceeded after max_document_bytes,
+    with truncate=True it ends after max_document_bytes instead.
+    """
+    def __init__(self, fileobj, budget, url=None, truncate=False):
+        self.fileobj = fileobj
+        self.budget = budget
+        self.url = url
+        self.truncate = truncate
+        self.truncated = False
+        self.size = 0
+
+    def read(self, size=-1):
+        if self.truncated:
+            return b''
+        data = self.fileobj.read(size)
+        self.size += len(data)
+        max_bytes = self.budget.max_document_bytes
+        if max_bytes is not None and self.size > max_bytes:
+            self.budget.mark_truncated('max_document_bytes', max_bytes, self.url)
+            if not self.truncate:
+                raise BudgetExceeded('Document larger than {} bytes'.format(max_bytes))
+            data = data[:len(data) - (self.size - max_bytes)]
+            self.size = max_bytes
+            self.truncated = True
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def track_stage(budget, stage):
+    """HarvestBudget.track() of an optional budget"""
+    return budget.track(stage) if budget is not None else nullcontext()
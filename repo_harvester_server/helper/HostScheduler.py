@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class _HostState:
+    def __init__(self, max_per_host):
+        self.semaphore = threading.BoundedSemaphore(max_per_host)
+        self.lock = threading.Lock()
+        self.next_allowed = 0.0
+        self.crawl_delay = 0.0
+
+
+class HostScheduler:
+    """
+    Politeness layer below FetchHelper: limits concurrent requests per host, keeps a minimum
+    delay between requests to the same host, honours Retry-After and robots.txt Crawl-delay
+    and caches parsed robots.txt files per host.
+    """
+    def __init__(self, max_per_host=2, min_delay=1.0, robots_ttl=3600, user_agent='*',
+                 respect_robots=True, max_retry_after=30.0, robots_timeout=10, robots_error_ttl=300):
+        self.max_per_host = max_per_host
+        self.min_delay = min_delay
+        self.robots_ttl = robots_ttl
+        self.user_agent = user_agent
+        self.respect_robots = respect_robots
+        # longest Retry-After a single fetch waits for before giving up
+        self.max_retry_after = max_retry_after
+        self.robots_timeout = robots_timeout
+        # seconds a 5xx or unreachable robots.txt (complete disallow) is cached
+        self.robots_error_ttl = robots_error_ttl
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._robots = {}
+
+    def get_host(self, url):
+        return urlparse(str(url)).netloc.lower()
+
+    def _get_host_state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState(self.max_per_host)
+            return state
+
+    def _load_robots(self, url):
+        # urllib.robotparser pulls in urllib.request, import it only when a crawl needs it
+        from urllib.robotparser import RobotFileParser
+        parts = urlparse(str(url))
+        robots_url = '{}://{}/robots.txt'.format(parts.scheme, parts.netloc)
+        parser = RobotFileParser(robots_url)
+        try:
+            import requests
+            response = requests.get(robots_url, timeout=self.robots_timeout)
+            if response.status_code >= 500:
+                # unreachable robots.txt: nothing is allowed (RFC 9309), ask again soon
+                parser.disallow_all = True
+                return parser, self.robots_error_ttl
+            if response.status_code >= 400:
+                # missing robots.txt: everything is allowed
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except Exception as e:
+            print('Loading robots.txt Error: ', robots_url, e)
+            parser.disallow_all = True
+            return parser, self.robots_error_ttl
+        return parser, self.robots_ttl
+
+    def get_robots(self, url):
+        host = self.get_host(url)
+        with self._lock:
+            cached = self._robots.get(host)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        parser, ttl = self._load_robots(url)
+        crawl_delay = parser.crawl_delay(self.user_agent)
+        if crawl_delay:
+            self._get_host_state(host).crawl_delay = float(crawl_delay)
+        with self._lock:
+            self._robots[host] = (parser, time.monotonic() + ttl)
+        return parser
+
+    def can_fetch(self, url):
+        if not self.respect_robots:
+            return True
+        return self.get_robots(url).can_fetch(self.user_agent, str(url))
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Blocks until a request to the host of url is allowed and holds one of its slots.
+        """
+        state = self._get_host_state(self.get_host(url))
+        with state.semaphore:
+            while True:
+                with state.lock:
+                    wait_time = state.next_allowed - time.monotonic()
+                    if wait_time <= 0:
+                        state.next_allowed = time.monotonic() + max(self.min_delay, state.crawl_delay)
+                        break
+                time.sleep(wait_time)
+            yield
+
+    def parse_retry_after(self, retry_after):
+        if not retry_after:
+            return None
+        retry_after = str(retry_after).strip()
+        if retry_after.isdigit():
+            return float(retry_after)
+        from email.utils import parsedate_to_datetime
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def defer(self, url, retry_after):
+        """
+        Pushes back the next allowed request to the host of url according to a Retry-After
+        header value and returns the delay in seconds (None if the header is unusable).
+        """
+        delay = self.parse_retry_after(retry_after)
+        if delay is not None:
+            state = self._get_host_state(self.get_host(url))
+            with state.lock:
+                state.next_allowed = max(state.next_allowed, time.monotonic() + delay)
+        return delay
+
+    def _next_allowed(self, host):
+        state = self._hosts.get(host)
+        return state.next_allowed if state is not None else 0.0
+
+    def map(self, func, urls, max_workers=8):
+        """
+        Runs func(url) for all urls in a thread pool. Hosts are interleaved so that the pool
+        stays busy while no host gets more than max_per_host jobs at once.
+        Yields (url, result) in completion order; exceptions are printed and yield None.
+        """
+        queues = OrderedDict()
+        for url in urls:
+            queues.setdefault(self.get_host(url), deque()).append(url)
+        active = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while queues or running:
+                now = time.monotonic()
+                submitted = False
+                for host in list(queues.keys()):
+                    if len(running) >= max_workers:
+                        break
+                    if active.get(host, 0) >= self.max_per_host or self._next_allowed(host) > now:
+                        continue
+                    url = queues[host].popleft()
+                    if not queues[host]:
+                        del queues[host]
+                    else:
+                        # round robin: serve this host again after all others
+                        queues.move_to_end(host)
+                    active[host] = active.get(host, 0) + 1
+                    running[executor.submit(func, url)] = (host, url)
+                    submitted = True
+                if submitted:
+                    continue
+                timeout = None
+                if queues:
+                    waiting = [self._next_allowed(h) for h in queues if active.get(h, 0) < self.max_per_host]
+                    if waiting:
+                        timeout = max(0.0, min(waiting) - time.monotonic())
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, url = running.pop(future)
+                    active[host] -= 1
+                    try:
+                        yield url, future.result()
+                    except Exception as e:
+                        print('Scheduled harvest Error: ', url, e)
+                        yield url, None
@@ -0,0 +1,108 @@
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Keys holding per-dataset listings; these subtrees are skipped while streaming catalog JSON-LD
+JSONLD_SKIP_KEYS = {
+    'dataset', 'schema:dataset', 'sdo:dataset', 'http://schema.org/dataset', 'https://schema.org/dataset',
+    'dcat:dataset', 'http://www.w3.org/ns/dcat#dataset',
+    'hasPart', 'schema:hasPart', 'http://schema.org/hasPart', 'https://schema.org/hasPart',
+    'distribution', 'schema:distribution', 'dcat:distribution', 'http://www.w3.org/ns/dcat#distribution',
+    'record', 'dcat:record', 'http://www.w3.org/ns/dcat#record',
+}
+# Node types which are dropped from node arrays (top level array or @graph) while streaming
+JSONLD_SKIP_TYPES = {
+    'Dataset', 'schema:Dataset', 'http://schema.org/Dataset', 'https://schema.org/Dataset',
+    'dcat:Dataset', 'http://www.w3.org/ns/dcat#Dataset',
+    'DataDownload', 'schema:DataDownload', 'http://schema.org/DataDownload', 'https://schema.org/DataDownload',
+    'dcat:Distribution', 'http://www.w3.org/ns/dcat#Distribution',
+    'dcat:CatalogRecord', 'http://www.w3.org/ns/dcat#CatalogRecord',
+}
+# Catalog and service types; nodes carrying one of them are kept even if they have a skipped type too
+JSONLD_KEEP_TYPES = {
+    'DataCatalog', 'schema:DataCatalog', 'http://schema.org/DataCatalog', 'https://schema.org/DataCatalog',
+    'dcat:Catalog', 'http://www.w3.org/ns/dcat#Catalog',
+    'Service', 'schema:Service', 'http://schema.org/Service', 'https://schema.org/Service',
+    'WebAPI', 'schema:WebAPI', 'http://schema.org/WebAPI', 'https://schema.org/WebAPI',
+    'dcat:DataService', 'http://www.w3.org/ns/dcat#DataService',
+}
+
+
+def is_streaming_available():
+    return ijson is not None
+
+
+def _is_skipped_node(node):
+    if isinstance(node, dict):
+        node_types = node.get('@type')
+        if not isinstance(node_types, list):
+            node_types = [node_types]
+        node_types = [t for t in node_types if isinstance(t, str)]
+        return any(t in JSONLD_SKIP_TYPES for t in node_types) and not any(t in JSONLD_KEEP_TYPES for t in node_types)
+    return False
+
+
+def load_pruned_jsonld(fileobj, skip_keys=None):
+    """
+    Incrementally parses a JSON-LD document from a binary file object and builds it without
+    per-dataset listings (see JSONLD_SKIP_KEYS and JSONLD_SKIP_TYPES), so memory stays bounded
+    by the size of the catalog level entries instead of the size of the document.
+    """
+    if skip_keys is None:
+        skip_keys = JSONLD_SKIP_KEYS
+    result = None
+    # each stack entry: [container, pending map key, is an array of graph nodes]
+    stack = []
+    skip_next = False
+    skip_depth = 0
+
+    def add(value):
+        nonlocal result
+        if not stack:
+            result = value
+        else:
+            container, key, _ = stack[-1]
+            if isinstance(container, list):
+                container.append(value)
+            else:
+                container[key] = value
+
+    for _, event, value in ijson.parse(fileobj, use_float=True):
+        if skip_depth:
+            if event in ('start_map', 'start_array'):
+                skip_depth += 1
+            elif event in ('end_map', 'end_array'):
+                skip_depth -= 1
+            continue
+        if skip_next:
+            skip_next = False
+            if event in ('start_map', 'start_array'):
+                skip_depth = 1
+            continue
+        if event == 'map_key':
+            if value in skip_keys:
+                skip_next = True
+            else:
+                stack[-1][1] = value
+        elif event == 'start_map':
+            stack.append([{}, None, False])
+        elif event == 'start_array':
+            # node arrays: a top level array (flattened or expanded documents) and @graph at any depth
+            is_graph = not stack or (isinstance(stack[-1][0], dict) and stack[-1][1] == '@graph')
+            stack.append([[], None, is_graph])
+        elif event in ('end_map', 'end_array'):
+            container = stack.pop()[0]
+            if stack and stack[-1][2] and _is_skipped_node(container):
+                continue
+            add(container)
+        else:
+            add(value)
+    return result
+
+
+def iter_linkset_items(fileobj):
+    """
+    Streams the single linkset entries of an application/linkset+json document.
+    """
+    return ijson.items(fileobj, 'linkset.item', use_float=True)
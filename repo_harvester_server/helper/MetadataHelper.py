@@ -1,21 +1,64 @@
 import json
 import re
-import rdflib
-import requests
-from rdflib import RDF, DCAT, SDO, DC, DCTERMS, FOAF
-from lxml import etree
-from lxml import html as lxml_html
 import logging
 import os
+import time
 
+from repo_harvester_server.helper import JsonStreamHelper
+from repo_harvester_server.helper.FetchHelper import FetchHelper
+from repo_harvester_server.helper.HarvestBudget import BudgetExceeded, track_stage
+
+# rdflib and lxml are imported on first use to keep server start up fast, see warm_up()
 #SMA = rdflib.Namespace("http://schema.org/")
-VCARD = rdflib.Namespace("http://www.w3.org/2006/vcard/ns#")
+VCARD_NS = "http://www.w3.org/2006/vcard/ns#"
 # Suppress the specific rdflib warning about URL templates
 logging.getLogger('rdflib.term').setLevel(logging.ERROR)
 
+# Remote JSON-LD contexts mapped to the document actually serving them
+JSONLD_CONTEXT_ALIASES = {
+    'http://schema.org': 'https://schema.org/docs/jsonldcontext.jsonld',
+    'https://schema.org': 'https://schema.org/docs/jsonldcontext.jsonld',
+    'http://www.schema.org': 'https://schema.org/docs/jsonldcontext.jsonld',
+    'https://www.schema.org': 'https://schema.org/docs/jsonldcontext.jsonld',
+}
+JSONLD_CONTEXT_ACCEPT = 'application/ld+json, application/json'
+# Minimal substitutes of well known contexts which are used when the context can not be loaded
+JSONLD_CONTEXT_FALLBACKS = {
+    'https://schema.org/docs/jsonldcontext.jsonld': {'@vocab': 'https://schema.org/'},
+}
+# Process wide cache of remote JSON-LD contexts: context url -> @context value
+_jsonld_context_cache = {}
+# Contexts which could not be loaded: context url -> time.monotonic() of the next attempt
+_jsonld_context_failures = {}
+# Seconds before a failed context is requested again
+JSONLD_CONTEXT_RETRY = 300
+# Contexts read from document stores during replays: (store dir, context url) -> @context value
+_stored_jsonld_contexts = {}
+
+
+def warm_up(fetcher=None):
+    """
+    Imports the parser modules, registers the rdflib parser plugins and fills the JSON-LD
+    context cache, so that the first harvest of a worker does not pay for it.
+    """
+    import rdflib
+    from lxml import html as lxml_html
+    import requests
+    lxml_html.fromstring('<html><head><title>warm up</title></head></html>')
+    rdflib.ConjunctiveGraph().parse(data={'@id': 'urn:warm-up', 'urn:p': 'o'}, format='json-ld')
+    rdflib.Graph().parse(data='<urn:warm-up> <urn:p> "o" .', format='turtle')
+    metadata_helper = MetadataHelper(fetcher=fetcher)
+    for context_url in set(JSONLD_CONTEXT_ALIASES.values()):
+        metadata_helper.get_remote_jsonld_context(context_url)
+
 
 class MetadataHelper:
-    def __init__(self):
+    def __init__(self, fetcher=None, streaming=False, budget=None):
+        self.fetcher = fetcher or FetchHelper()
+        # optional HarvestBudget limiting document sizes and graph triples
+        self.budget = budget
+        # parse linked JSON-LD incrementally and skip per-dataset listings
+        self.streaming = streaming and JsonStreamHelper.is_streaming_available()
         # Get the directory where the current script is located
         helper_dir = os.path.dirname(os.path.abspath(__file__))
         # Construct the absolute path to the xslt file
@@ -30,6 +73,7 @@ class MetadataHelper:
             return metadata
 
         try:
+            from lxml import html as lxml_html
             doc = lxml_html.fromstring(html_content)
 
             description = doc.xpath('//meta[@name="description"]/@content')
@@ -56,6 +100,7 @@ class MetadataHelper:
         Return True if this node or ANY ancestor node upward
         (following any predicate) has rdf:type in target_types.
         """
+        from rdflib import RDF, DCAT, SDO
         target_types = [DCAT.Catalog, SDO.DataCatalog]  # faster membership test
         visited = set()
         def dfs(n):
@@ -73,6 +118,7 @@ class MetadataHelper:
         return dfs(node)
 
     def _get_jsonld_service_metadata(self, g):
+        from rdflib import RDF, DCAT, SDO, DCTERMS
         services = []
         for service in list(g[: RDF.type: SDO.Service]) + list(g[: RDF.type: DCAT.DataService]):
             if self._is_in_catalog_path(g, service):
@@ -93,6 +139,9 @@ class MetadataHelper:
         return services
 
     def _get_jsonld_descriptive_metadata(self, jg):
+        import rdflib
+        from rdflib import RDF, DCAT, SDO, DC, DCTERMS, FOAF
+        VCARD = rdflib.Namespace(VCARD_NS)
         metadata = {}
         for catalog in list(jg[: RDF.type: DCAT.Catalog]) + list(jg[: RDF.type: SDO.DataCatalog]) + list(jg[: RDF.type: SDO.DataCatalog]):
             metadata["resource_type"] = []
@@ -144,7 +193,8 @@ class MetadataHelper:
 
     def _fix_schemaorg_namespace_jsonld(self, g):
         #See: https://github.com/RDFLib/rdflib/issues/1120
-        for s, p, o in g.triples(None):
+        import rdflib
+        for s, p, o in list(g.triples((None, None, None))):
             changed = False
             new_s = s
             if str(s).startswith("http://schema.org"):
@@ -162,29 +212,158 @@ class MetadataHelper:
             if changed:
                 g.remove((s, p, o))
                 g.add((new_s, new_p, new_o))
-            return g
+        return g
+
+    def get_remote_jsonld_context(self, context_url):
+        context_url = JSONLD_CONTEXT_ALIASES.get(str(context_url).rstrip('/'), context_url)
+        if self.fetcher.replay:
+            # replayed harvests only use the contexts recorded in the document store
+            return self._get_stored_jsonld_context(context_url)
+        if context_url in _jsonld_context_cache:
+            self._record_jsonld_context(context_url, _jsonld_context_cache[context_url])
+            return _jsonld_context_cache[context_url]
+        if _jsonld_context_failures.get(context_url, 0) > time.monotonic():
+            return None
+        context = None
+        response = self.fetcher.get(context_url, headers={'Accept': JSONLD_CONTEXT_ACCEPT})
+        if response is None and getattr(self.fetcher, 'is_pending', None) and self.fetcher.is_pending(context_url):
+            # not fetched yet by the async harvest, do not cache the miss
+            return None
+        if response is not None:
+            try:
+                context = response.json().get('@context')
+            except Exception as e:
+                print('Loading JSON-LD context Error: ', context_url, e)
+        if context is None:
+            # retried later, a transient failure must not disable the cache for the whole process
+            _jsonld_context_failures[context_url] = time.monotonic() + JSONLD_CONTEXT_RETRY
+            return None
+        _jsonld_context_failures.pop(context_url, None)
+        _jsonld_context_cache[context_url] = context
+        return context
+
+    def _record_jsonld_context(self, context_url, context):
+        # a context taken from the process cache has to be in the store as well, replays depend on it
+        document_store = self.fetcher.document_store
+        if document_store is None or context is None \
+                or document_store.lookup(context_url, JSONLD_CONTEXT_ACCEPT) is not None:
+            return
+        digest = document_store.put(json.dumps({'@context': context}))
+        document_store.record(context_url, digest, {'Content-Type': 'application/ld+json'}, 200, context_url, 'utf-8',
+                              JSONLD_CONTEXT_ACCEPT)
+
+    def _get_stored_jsonld_context(self, context_url):
+        key = (self.fetcher.document_store.store_dir, context_url)
+        if key not in _stored_jsonld_contexts:
+            context = None
+            response = self.fetcher.get(context_url, headers={'Accept': JSONLD_CONTEXT_ACCEPT})
+            if response is not None:
+                try:
+                    context = response.json().get('@context')
+                except Exception as e:
+                    print('Loading stored JSON-LD context Error: ', context_url, e)
+            _stored_jsonld_contexts[key] = context
+        return _stored_jsonld_contexts[key]
+
+    def _resolve_remote_jsonld_context(self, context_url):
+        resolved = self.get_remote_jsonld_context(context_url)
+        if resolved is None:
+            if getattr(self.fetcher, 'is_pending', None) and self.fetcher.is_pending(
+                    JSONLD_CONTEXT_ALIASES.get(str(context_url).rstrip('/'), context_url)):
+                # the async harvest fetches the context and parses the document again in its next pass
+                raise ValueError('JSON-LD context not fetched yet: {}'.format(context_url))
+            # never leave a remote context to rdflib: its loader bypasses timeouts, negative cache,
+            # circuit breaker, scheduler and document store, and replays must not touch the network
+            resolved = JSONLD_CONTEXT_FALLBACKS.get(JSONLD_CONTEXT_ALIASES.get(str(context_url).rstrip('/'), context_url))
+            if resolved is None:
+                raise ValueError('JSON-LD context could not be loaded: {}'.format(context_url))
+            print('Using fallback for JSON-LD context: ', context_url)
+        return resolved
 
-    def get_jsonld_metadata(self, jstr):
+    def _resolve_jsonld_contexts(self, jdoc):
+        # replaces remote @context references of the document and of nested nodes by their cached content
+        if isinstance(jdoc, list):
+            for node in jdoc:
+                self._resolve_jsonld_contexts(node)
+        elif isinstance(jdoc, dict):
+            context = jdoc.get('@context')
+            if isinstance(context, str) and context.startswith('http'):
+                jdoc['@context'] = self._resolve_remote_jsonld_context(context)
+            elif isinstance(context, list):
+                for i, ctx in enumerate(context):
+                    if isinstance(ctx, str) and ctx.startswith('http'):
+                        context[i] = self._resolve_remote_jsonld_context(ctx)
+            for key, value in jdoc.items():
+                if key != '@context' and isinstance(value, (dict, list)):
+                    self._resolve_jsonld_contexts(value)
+        return jdoc
+
+    def _parse_graph(self, data, format):
+        import rdflib
+        if self.budget is not None:
+            cg = self.budget.new_graph()
+            try:
+                return cg.parse(data=data, format=format)
+            except BudgetExceeded:
+                # continue with the triples parsed so far
+                self.budget.mark_truncated('max_graph_triples', self.budget.max_graph_triples)
+                return cg
+            finally:
+                # the limit bounds parsing, _fix_schemaorg_namespace_jsonld removes and adds triples afterwards
+                cg.store.max_triples = None
+        cg = rdflib.ConjunctiveGraph()
+        return cg.parse(data=data, format=format)
+
+    def get_jsonld_metadata(self, jstr, stage='jsonld'):
         metadata = {}
-        if isinstance(jstr, str):
+        if isinstance(jstr, (str, dict, list)):
             # print(jstr[:1000])
-            cg = rdflib.ConjunctiveGraph()
-            jg = cg.parse(data=jstr, format='json-ld')
-            jg = self._fix_schemaorg_namespace_jsonld(jg)
-            metadata = self._get_jsonld_descriptive_metadata(jg)
-            metadata['services'] = self._get_jsonld_service_metadata(jg)
+            jdoc = json.loads(jstr) if isinstance(jstr, str) else jstr
+            # remote contexts may be fetched, only the parsing is traced
+            jdoc = self._resolve_jsonld_contexts(jdoc)
+            with track_stage(self.budget, stage):
+                jg = self._parse_graph(jdoc, 'json-ld')
+                jg = self._fix_schemaorg_namespace_jsonld(jg)
+                metadata = self._get_jsonld_descriptive_metadata(jg)
+                metadata['services'] = self._get_jsonld_service_metadata(jg)
         else:
             print('Expecting JSON-LD string not: ', type(jstr))
         return metadata
 
+    def get_rdf_metadata(self, rdf_str, format='turtle', stage='rdf'):
+        """
+        Extracts catalog and service metadata from a non JSON-LD RDF serialization
+        such as a content negotiated Turtle representation of the landing page.
+        """
+        metadata = {}
+        if isinstance(rdf_str, str):
+            with track_stage(self.budget, stage):
+                g = self._parse_graph(rdf_str, format)
+                g = self._fix_schemaorg_namespace_jsonld(g)
+                metadata = self._get_jsonld_descriptive_metadata(g)
+                metadata['services'] = self._get_jsonld_service_metadata(g)
+        else:
+            print('Expecting RDF string not: ', type(rdf_str))
+        return metadata
+
     def get_linked_jsonld_metadata(self, typed_link):
         ljson = None
         metadata = {}
         if 'http' in str(typed_link):
             try:
-                ljson = requests.get(typed_link).json()
-                ljson = json.dumps(ljson)
-                metadata = self.get_jsonld_metadata(ljson)
+                if self.streaming:
+                    response = self.fetcher.get(typed_link, stream=True, budget=self.budget)
+                    if response is not None:
+                        try:
+                            ljson = JsonStreamHelper.load_pruned_jsonld(response.raw)
+                        finally:
+                            response.close()
+                        metadata = self.get_jsonld_metadata(ljson, 'linked_jsonld')
+                else:
+                    response = self.fetcher.get(typed_link, budget=self.budget)
+                    if response is not None:
+                        ljson = response.json()
+                        metadata = self.get_jsonld_metadata(ljson, 'linked_jsonld')
             except json.JSONDecodeError as je:
                 print('Loading malformed linked JSON-LD Error: ', je)
             except Exception as e:
@@ -199,9 +378,8 @@ class MetadataHelper:
             try:
                 jsr = re.search(jsp, html, re.DOTALL)
                 if jsr:
-                    ejson = jsr[1]
-                    json.loads(ejson)
-                    metadata = self.get_jsonld_metadata(ejson)
+                    ejson = json.loads(jsr[1])
+                    metadata = self.get_jsonld_metadata(ejson, 'embedded_jsonld')
             except Exception as e:
                 print('Loading embedded JSON-LD Error: ', e)
         return metadata
\ No newline at end of file
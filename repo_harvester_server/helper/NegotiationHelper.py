@@ -0,0 +1,87 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+# Machine readable representations of a catalog landing page, cheapest first
+REPRESENTATIONS = {
+    'jsonld': ['application/ld+json'],
+    'turtle': ['text/turtle', 'application/x-turtle'],
+    'linkset': ['application/linkset+json'],
+    'html': ['text/html', 'application/xhtml+xml'],
+}
+
+NEGOTIATION_ACCEPT = ('application/ld+json;q=1.0, text/turtle;q=0.9, application/linkset+json;q=0.8, '
+                      'text/html;q=0.5, application/xhtml+xml;q=0.5, */*;q=0.1')
+
+
+def get_representation(content_type):
+    """
+    Maps a Content-Type header value to one of the REPRESENTATIONS keys (None if unknown).
+    """
+    media_type = str(content_type or '').split(';')[0].strip().lower()
+    for representation, media_types in REPRESENTATIONS.items():
+        if media_type in media_types:
+            return representation
+    return None
+
+
+def get_accept_encoding():
+    # only advertise encodings urllib3 can decode here, e.g. br needs brotli installed
+    from urllib3.util import make_headers
+    return make_headers(accept_encoding=True).get('accept-encoding', 'gzip, deflate')
+
+
+class NegotiationMemo:
+    """
+    Remembers per host which representation of a catalog could be harvested, so later
+    harvests ask for that representation directly. With a SharedCache the memo is shared
+    by all workers of a node.
+    """
+    def __init__(self, ttl=7 * 86400, cache=None):
+        self.ttl = ttl
+        self.cache = cache
+        self._lock = threading.Lock()
+        # host -> (representation, expires)
+        self._hosts = {}
+
+    def get_host(self, url):
+        return urlparse(str(url)).netloc.lower()
+
+    def get(self, url):
+        host = self.get_host(url)
+        with self._lock:
+            entry = self._hosts.get(host)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        if self.cache is not None:
+            representation = self.cache.get_json('negotiation:' + host)
+            if representation is not None:
+                with self._lock:
+                    self._hosts[host] = (representation, time.monotonic() + self.ttl)
+                return representation
+        return None
+
+    def remember(self, url, representation):
+        host = self.get_host(url)
+        with self._lock:
+            self._hosts[host] = (representation, time.monotonic() + self.ttl)
+        if self.cache is not None:
+            self.cache.set_json('negotiation:' + host, representation, self.ttl)
+
+    def get_request_headers(self, url):
+        """
+        Returns the headers for negotiating the catalog at url, None for a plain request if the
+        host is known to serve HTML only.
+        """
+        representation = self.get(url)
+        if representation == 'html':
+            return None
+        if representation in REPRESENTATIONS:
+            accept = '{};q=1.0, text/html;q=0.1'.format(REPRESENTATIONS[representation][0])
+        else:
+            accept = NEGOTIATION_ACCEPT
+        return {'Accept': accept, 'Accept-Encoding': get_accept_encoding()}
+
+
+# process wide memo used when a harvester does not get its own
+default_negotiation_memo = NegotiationMemo()
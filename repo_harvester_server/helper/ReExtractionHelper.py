@@ -0,0 +1,44 @@
+import json
+import multiprocessing
+import sys
+
+from repo_harvester_server.helper.DocumentStore import DocumentStore
+from repo_harvester_server.helper.FetchHelper import FetchHelper
+from repo_harvester_server.helper.RepositoryHarvester import CatalogMetadataHarvester
+
+_worker_store = None
+
+
+def _init_worker(store_dir):
+    global _worker_store
+    _worker_store = DocumentStore(store_dir)
+
+
+def _reextract_catalog(catalog_url):
+    harvester = CatalogMetadataHarvester(catalog_url, fetcher=FetchHelper(_worker_store, replay=True))
+    try:
+        harvester.harvest_self_hosted_metadata()
+    except Exception as e:
+        print('Re-extraction Error: ', catalog_url, e)
+    return catalog_url, harvester.metadata
+
+
+def reextract_corpus(store_dir, processes=None, chunksize=8):
+    """
+    Re-runs the extraction stages over every catalog stored in a DocumentStore using a
+    process pool. Documents are replayed from the store, no outbound request is made.
+    Yields (catalog_url, metadata) tuples in completion order.
+    """
+    store = DocumentStore(store_dir)
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(store.store_dir,)) as pool:
+        for result in pool.imap_unordered(_reextract_catalog, store.iter_catalogs(), chunksize):
+            yield result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: python -m repo_harvester_server.helper.ReExtractionHelper <store_dir> <output.jsonl>')
+        sys.exit(1)
+    with open(sys.argv[2], 'w', encoding='utf-8') as out:
+        for url, metadata in reextract_corpus(sys.argv[1]):
+            out.write(json.dumps({'url': url, 'metadata': metadata}) + '\n')
@@ -1,19 +1,39 @@
+import asyncio
 import json
 import re
 from urllib.parse import urlparse, urljoin
 
-import rdflib
-from lxml import html
-import requests
-from rdflib import RDF, DCAT, SDO, DC, DCTERMS, FOAF
-
+from repo_harvester_server.helper.AsyncFetchHelper import AsyncFetchHelper, PrefetchedFetcher
+from repo_harvester_server.helper.CircuitBreaker import CircuitBreaker, NegativeCache
+from repo_harvester_server.helper.FetchHelper import FetchHelper
+from repo_harvester_server.helper.HostScheduler import HostScheduler
+from repo_harvester_server.helper import JsonStreamHelper
+from repo_harvester_server.helper import NegotiationHelper
+from repo_harvester_server.helper import UrlHelper
 from repo_harvester_server.helper.SignPostingHelper import SignPostingHelper
 from repo_harvester_server.helper.MetadataHelper import MetadataHelper
 
 
 class CatalogMetadataHarvester:
-    def __init__(self, catalog_url):
+    def __init__(self, catalog_url, fetcher=None, streaming=False, budget=None, cache=None, cache_ttl=86400,
+                 negotiate=False, negotiation_memo=None, redirect_memo=None):
+        # catalog_url becomes the canonical (normalized, redirect resolved) URL during the harvest
+        self.requested_url = catalog_url
         self.catalog_url = catalog_url
+        self.redirect_memo = redirect_memo or UrlHelper.default_redirect_memo
+        # True once the catalog request has been permanently redirected to catalog_url
+        self.permanently_redirected = False
+        self.fetcher = fetcher or FetchHelper()
+        # bounded memory parsing of linked JSON-LD and linksets, requires ijson
+        self.streaming = streaming
+        # optional HarvestBudget with size limits and per stage memory tracing
+        self.budget = budget
+        # optional SharedCache holding harvest results for all workers of a node
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        # ask for machine readable representations of the catalog URL before falling back to HTML
+        self.negotiate = negotiate
+        self.negotiation_memo = negotiation_memo or NegotiationHelper.default_negotiation_memo
         self.catalog_html = None
         self.signposting_links = []
         self.metadata = {}
@@ -24,6 +44,10 @@ class CatalogMetadataHarvester:
                 if key not in self.metadata:
                     self.metadata[key] = new_metadata[key]
 
+    def _set_truncation_marker(self):
+        if self.budget is not None and self.budget.truncated:
+            self.metadata['truncated'] = list(self.budget.truncated)
+
     def harvest(self):
         self.harvest_self_hosted_metadata()
         self.harvest_registry_metadata()
@@ -32,31 +56,285 @@ class CatalogMetadataHarvester:
         print()
 
     def harvest_self_hosted_metadata(self):
+        if self.fetcher.replay:
+            # stored documents are keyed by the URL which was requested at the time
+            self.catalog_url = UrlHelper.normalize_url(self.catalog_url)
+        else:
+            self.catalog_url = self.redirect_memo.get_canonical_url(self.catalog_url)
+        if self.cache is None:
+            self._harvest_self_hosted_metadata()
+            return
+        cache_url = self.catalog_url
+
+        def harvest_uncached():
+            self._harvest_self_hosted_metadata()
+            # failed or truncated harvests are not shared
+            if self.metadata and 'truncated' not in self.metadata:
+                if self.catalog_url != cache_url and self.permanently_redirected:
+                    # redirected: share the result under the canonical URL as well
+                    self.cache.set_json('harvest:' + str(self.catalog_url), self.metadata, self.cache_ttl)
+                return self.metadata
+            return None
+
+        cached_metadata = self.cache.get_or_compute_json('harvest:' + str(cache_url), harvest_uncached,
+                                                         self.cache_ttl)
+        if cached_metadata is not None:
+            self.metadata = cached_metadata
+
+    def _follow_redirects(self, requested_url, response):
+        """
+        Switches to the final URL of the catalog request; permanent redirect chains are memoized
+        and make the final URL the canonical one.
+        Returns True if a harvest result for the canonical URL has been taken from the cache.
+        """
+        final_url = UrlHelper.normalize_url(getattr(response, 'url', None) or requested_url)
+        if final_url == UrlHelper.normalize_url(requested_url):
+            return False
+        self.catalog_url = final_url
+        history = getattr(response, 'history', None) or []
+        if not UrlHelper.is_permanent_redirect(history):
+            # e.g. several repositories redirecting to the same login page: neither remembered nor shared
+            return False
+        self.permanently_redirected = True
+        if not self.fetcher.replay:
+            self.redirect_memo.remember([requested_url] + [hop.url for hop in history], final_url)
+        if self.cache is not None:
+            cached_metadata = self.cache.get_json('harvest:' + final_url)
+            if cached_metadata is not None:
+                print('Using cached harvest of canonical URL', final_url)
+                self.metadata = cached_metadata
+                return True
+        return False
+
+    def _harvest_signposted_metadata(self, signposting_helper, metadata_helper):
+        #linked
+        for jsonld_link in signposting_helper.get_links('describedby', 'application/ld+json'):
+            linked_jsonld_metadata = metadata_helper.get_linked_jsonld_metadata(jsonld_link.get('link'))
+            self.merge_metadata(linked_jsonld_metadata)
+            print('LINKED JSONLD METADATA: ',linked_jsonld_metadata)
+        #signposting api catalog
+        fairicat_metadata = signposting_helper.get_fairicat_metadata()
+        self.merge_metadata(fairicat_metadata)
+        self._set_truncation_marker()
+        if self.budget is not None and self.budget.memory_report:
+            print('PEAK MEMORY PER STAGE: ', self.budget.memory_report)
+        print('MERGED METADATA: ', json.dumps(self.metadata, indent=4))
+
+    def _harvest_negotiated_metadata(self, response, representation):
+        """
+        Harvests a machine readable (JSON-LD, Turtle or linkset) response of the catalog URL
+        directly, returns False if it did not contain any usable metadata.
+        """
+        metadata_helper = MetadataHelper(fetcher=self.fetcher, streaming=self.streaming, budget=self.budget)
+        metadata = {}
+        linkset_json = None
+        try:
+            if representation == 'jsonld':
+                if self._is_streaming():
+                    # catalogs listing every dataset can be hundreds of MB, keep only the catalog level
+                    try:
+                        jsonld = JsonStreamHelper.load_pruned_jsonld(response.raw)
+                    finally:
+                        response.close()
+                else:
+                    jsonld = response.json()
+                metadata = metadata_helper.get_jsonld_metadata(jsonld, 'negotiated_metadata')
+            elif representation == 'turtle':
+                metadata = metadata_helper.get_rdf_metadata(response.text, 'turtle', 'negotiated_metadata')
+            elif representation == 'linkset':
+                linkset_json = response.json()
+        except Exception as e:
+            print('Loading negotiated {} Error: '.format(representation), e)
+            return False
+        print('NEGOTIATED {} METADATA: '.format(representation.upper()), metadata)
+        signposting_helper = SignPostingHelper(self.catalog_url, '', response.headers, fetcher=self.fetcher,
+                                               streaming=self.streaming, budget=self.budget,
+                                               linkset_json=linkset_json)
+        self.signposting_links = signposting_helper.links
+        self.merge_metadata(metadata)
+        self._harvest_signposted_metadata(signposting_helper, metadata_helper)
+        return any(value for key, value in self.metadata.items() if key != 'truncated')
+
+    def _is_streaming(self):
+        return self.streaming and JsonStreamHelper.is_streaming_available()
+
+    def _get_catalog_request_headers(self):
+        """
+        Returns the headers for requesting the catalog URL, None for a plain request of the landing page.
+        """
+        if self.fetcher.replay:
+            # replay the representation which has been requested when the catalog was harvested
+            catalog = self.fetcher.document_store.get_catalog(self.catalog_url)
+            accept = catalog.get('accept') if catalog else None
+            return {'Accept': accept} if accept else None
+        if self.negotiate:
+            return self.negotiation_memo.get_request_headers(self.catalog_url)
+        return None
+
+    def _remember_representation(self, representation, response):
+        # error pages, e.g. a 404 in HTML, tell nothing about the representations of the catalog
+        if not self.fetcher.replay and 200 <= response.status_code < 300:
+            self.negotiation_memo.remember(self.catalog_url, representation)
+
+    def _harvest_self_hosted_metadata(self):
         # TODO: add browser like Agent info
         if str(self.catalog_url).startswith('http'):
             # try:
             if 1 == 1:
-                response = requests.get(self.catalog_url)
+                request_headers = self._get_catalog_request_headers()
+                negotiated = request_headers is not None
+                fetch_url = self.catalog_url
+                # a negotiated JSON-LD catalog can be parsed incrementally from the raw response,
+                # an oversized landing page is harvested from its first max_document_bytes
+                response = self.fetcher.get(fetch_url, headers=request_headers, budget=self.budget,
+                                            stream=negotiated and self._is_streaming(), truncate=True)
+                if response is None:
+                    print('Could not retrieve repo URI', fetch_url)
+                    self._set_truncation_marker()
+                    return
+                if self.fetcher.document_store is not None and not self.fetcher.replay:
+                    self.fetcher.document_store.add_catalog(fetch_url,
+                                                            request_headers.get('Accept') if negotiated else None)
+                if self._follow_redirects(fetch_url, response):
+                    return
+                if negotiated:
+                    representation = NegotiationHelper.get_representation(response.headers.get('Content-Type'))
+                    if representation not in (None, 'html'):
+                        if self._harvest_negotiated_metadata(response, representation):
+                            self._remember_representation(representation, response)
+                            return
+                        # nothing usable in the machine readable representation, use the landing page
+                        self.metadata = {}
+                        response = self.fetcher.get(fetch_url, budget=self.budget, truncate=True)
+                        if response is None:
+                            print('Could not retrieve repo URI', fetch_url)
+                            self._set_truncation_marker()
+                            return
+                    self._remember_representation('html', response)
                 self.catalog_html = response.text
                 self.catalog_header = response.headers
-                signposting_helper = SignPostingHelper(self.catalog_url, self.catalog_html, self.catalog_header)
-                metadata_helper = MetadataHelper()
+                signposting_helper = SignPostingHelper(self.catalog_url, self.catalog_html, self.catalog_header,
+                                                       fetcher=self.fetcher, streaming=self.streaming,
+                                                       budget=self.budget)
+                metadata_helper = MetadataHelper(fetcher=self.fetcher, streaming=self.streaming, budget=self.budget)
                 self.signposting_links = signposting_helper.links
                 #embedded
                 embedded_jsonld_metadata = metadata_helper.get_embedded_jsonld_metadata(self.catalog_html)
                 self.merge_metadata(embedded_jsonld_metadata)
                 print('EMBEDDED JSONLD METADATA: ', embedded_jsonld_metadata)
-                #linked
-                for jsonld_link in signposting_helper.get_links('describedby', 'application/ld+json'):
-                    linked_jsonld_metadata = metadata_helper.get_linked_jsonld_metadata(jsonld_link.get('link'))
-                    self.merge_metadata(linked_jsonld_metadata)
-                    print('LINKED JSONLD METADATA: ',linked_jsonld_metadata)
-                #signposting api catalog
-                fairicat_metadata = signposting_helper.get_fairicat_metadata()
-                self.merge_metadata(fairicat_metadata)
-                print('MERGED METADATA: ', json.dumps(self.metadata, indent=4))
+                self._harvest_signposted_metadata(signposting_helper, metadata_helper)
         else:
             print('Invalid repo URI', self.catalog_url)
 
 
+class AsyncCatalogMetadataHarvester(CatalogMetadataHarvester):
+    """
+    Non blocking harvest pipeline for the async server. Documents are fetched by an AsyncFetchHelper,
+    the extraction runs the synchronous helpers in a worker thread on the documents fetched so far
+    and is repeated with the documents it asked for until it does not need any further ones.
+    """
+    def __init__(self, catalog_url, async_fetcher=None, max_passes=5, **kwargs):
+        super().__init__(catalog_url, fetcher=PrefetchedFetcher(), **kwargs)
+        self.async_fetcher = async_fetcher or AsyncFetchHelper()
+        # catalog page, linksets and linked JSON-LD, remote contexts of linked JSON-LD...
+        self.max_passes = max_passes
+
+    async def harvest_async(self):
+        await self.harvest_self_hosted_metadata_async()
+        self.harvest_registry_metadata()
+
+    async def harvest_self_hosted_metadata_async(self):
+        # the memos and the cache are backed by SQLite, keep their calls off the event loop
+        self.catalog_url = await asyncio.to_thread(self.redirect_memo.get_canonical_url, self.catalog_url)
+        if self.cache is None:
+            await self._harvest_prefetched()
+            return
+        cache_url = self.catalog_url
+
+        async def harvest_uncached():
+            await self._harvest_prefetched()
+            # failed or truncated harvests are not shared
+            if self.metadata and 'truncated' not in self.metadata:
+                if self.catalog_url != cache_url and self.permanently_redirected:
+                    # redirected: share the result under the canonical URL as well
+                    await asyncio.to_thread(self.cache.set_json, 'harvest:' + str(self.catalog_url),
+                                            self.metadata, self.cache_ttl)
+                return self.metadata
+            return None
+
+        cached_metadata = await self.cache.get_or_compute_json_async('harvest:' + str(cache_url), harvest_uncached,
+                                                                     self.cache_ttl)
+        if cached_metadata is not None:
+            self.metadata = cached_metadata
+
+    async def _harvest_prefetched(self):
+        requested_url = self.catalog_url
+        for extraction_pass in range(1, self.max_passes + 1):
+            self.fetcher.pending = {}
+            self.catalog_url = requested_url
+            self.permanently_redirected = False
+            self.metadata = {}
+            self.signposting_links = []
+            await asyncio.to_thread(self._harvest_self_hosted_metadata)
+            pending = list(self.fetcher.pending.items())
+            if not pending:
+                return
+            if extraction_pass == self.max_passes:
+                print('Documents still missing after {} extraction passes: '.format(self.max_passes),
+                      [key[0] for key, headers in pending])
+                return
+            responses = await asyncio.gather(*[self.async_fetcher.get(key[0], headers, self.budget)
+                                               for key, headers in pending], return_exceptions=True)
+            for (key, headers), response in zip(pending, responses):
+                if isinstance(response, Exception):
+                    # one broken link must not fail the whole harvest
+                    print('Fetch Error: ', key[0], response)
+                    response = None
+                self.fetcher.documents[key] = response
+
+
+def harvest_catalogs(catalog_urls, fetcher=None, max_workers=8, streaming=False, cache=None, negotiate=False):
+    """
+    Harvests many catalogs concurrently through a shared HostScheduler so that hosts are
+    interleaved and none of them is overloaded. Yields (catalog_url, metadata).
+    """
+    if fetcher is None:
+        fetcher = FetchHelper(scheduler=HostScheduler(), negative_cache=NegativeCache(),
+                              circuit_breaker=CircuitBreaker())
+    elif fetcher.scheduler is None:
+        fetcher.scheduler = HostScheduler()
+
+    def harvest_catalog(catalog_url):
+        harvester = CatalogMetadataHarvester(catalog_url, fetcher=fetcher, streaming=streaming, cache=cache,
+                                             negotiate=negotiate)
+        harvester.harvest()
+        return harvester.metadata
+
+    return fetcher.scheduler.map(harvest_catalog, catalog_urls, max_workers=max_workers)
+
+
+async def harvest_catalogs_async(catalog_urls, async_fetcher=None, max_concurrency=1000, streaming=False, cache=None,
+                                 negotiate=False):
+    """
+    Harvests many catalogs concurrently on the running event loop, at most max_concurrency at a time.
+    Yields (catalog_url, metadata) in the order the harvests complete.
+    """
+    own_fetcher = async_fetcher is None
+    if own_fetcher:
+        async_fetcher = AsyncFetchHelper(negative_cache=NegativeCache(), circuit_breaker=CircuitBreaker(),
+                                         scheduler=HostScheduler())
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def harvest_catalog(catalog_url):
+        async with semaphore:
+            harvester = AsyncCatalogMetadataHarvester(catalog_url, async_fetcher=async_fetcher, streaming=streaming,
+                                                      cache=cache, negotiate=negotiate)
+            await harvester.harvest_async()
+            return catalog_url, harvester.metadata
 
+    try:
+        for harvest in asyncio.as_completed([harvest_catalog(catalog_url) for catalog_url in catalog_urls]):
+            yield await harvest
+    finally:
+        if own_fetcher:
+            await async_fetcher.aclose()
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class SharedCache:
+    """
+    Node wide cache shared by all worker processes, backed by a SQLite database in WAL mode.
+    Entries are written atomically and carry a TTL, the database is kept below max_bytes by
+    evicting expired and then least recently used entries; the total size is kept up to date
+    on every write, so only writes exceeding max_bytes scan the table. get_or_compute() lets only one
+    worker (process or thread) compute a missing entry while the others wait for it.
+    """
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, default_ttl=3600, lock_timeout=120,
+                 poll_interval=0.05):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # seconds after which a computing worker is assumed dead and its lock is taken over
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB, expires REAL, size INTEGER, accessed REAL);
+                CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+                CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT, expires REAL);
+                CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER);
+                INSERT OR IGNORE INTO stats (name, value)
+                    VALUES ('total_size', (SELECT COALESCE(SUM(size), 0) FROM entries));
+            ''')
+
+    def _connect(self):
+        # sqlite connections must not be shared across threads or forked processes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute('SELECT value, accessed FROM entries WHERE key = ? AND expires > ?',
+                                 (key, now)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > 60:
+            # refresh LRU position at most once a minute to keep reads cheap
+            connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            old_size = self._get_size(connection, key)
+            connection.execute('INSERT OR REPLACE INTO entries (key, value, expires, size, accessed) '
+                               'VALUES (?, ?, ?, ?, ?)', (key, value, now + ttl, len(value), now))
+            total = self._add_total_size(connection, len(value) - old_size)
+            if total > self.max_bytes:
+                self._evict(connection, now)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _get_size(self, connection, key):
+        row = connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def _add_total_size(self, connection, delta):
+        connection.execute("UPDATE stats SET value = value + ? WHERE name = 'total_size'", (delta,))
+        return connection.execute("SELECT value FROM stats WHERE name = 'total_size'").fetchone()[0]
+
+    def _evict(self, connection, now):
+        # runs inside the write transaction of set(), only when the total exceeds max_bytes
+        connection.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total > self.max_bytes:
+            for key, size in connection.execute('SELECT key, size FROM entries ORDER BY accessed').fetchall():
+                connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        connection.execute("UPDATE stats SET value = ? WHERE name = 'total_size'", (total,))
+
+    def delete(self, key):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            size = self._get_size(connection, key)
+            connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._add_total_size(connection, -size)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _acquire_lock(self, key, owner):
+        connection = self._connect()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('DELETE FROM locks WHERE key = ? AND expires <= ?', (key, now))
+            cursor = connection.execute('INSERT OR IGNORE INTO locks (key, owner, expires) VALUES (?, ?, ?)',
+                                        (key, owner, now + self.lock_timeout))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def _release_lock(self, key, owner):
+        self._connect().execute('DELETE FROM locks WHERE key = ? AND owner = ?', (key, owner))
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """
+        Returns the cached bytes for key or fills the entry with compute(), which has to return
+        bytes, str or None (None results are not cached). Concurrent callers for the same key
+        wait for the single computing worker instead of computing the value again.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        owner = uuid.uuid4().hex
+        deadline = time.time() + self.lock_timeout
+        while True:
+            if self._acquire_lock(key, owner):
+                try:
+                    value = self.get(key)
+                    if value is None:
+                        value = compute()
+                        if value is not None:
+                            self.set(key, value, ttl)
+                    return value
+                finally:
+                    self._release_lock(key, owner)
+            time.sleep(self.poll_interval)
+            value = self.get(key)
+            if value is not None:
+                return value
+            if time.time() > deadline:
+                return compute()
+
+    async def get_or_compute_async(self, key, compute, ttl=None):
+        """
+        Coroutine variant of get_or_compute() for the event loop: compute is a coroutine function,
+        database calls run in worker threads and waiting callers sleep without blocking the loop.
+        """
+        value = await asyncio.to_thread(self.get, key)
+        if value is not None:
+            return value
+        owner = uuid.uuid4().hex
+        deadline = time.time() + self.lock_timeout
+        while True:
+            if await asyncio.to_thread(self._acquire_lock, key, owner):
+                try:
+                    value = await asyncio.to_thread(self.get, key)
+                    if value is None:
+                        value = await compute()
+                        if value is not None:
+                            await asyncio.to_thread(self.set, key, value, ttl)
+                    return value
+                finally:
+                    await asyncio.to_thread(self._release_lock, key, owner)
+            await asyncio.sleep(self.poll_interval)
+            value = await asyncio.to_thread(self.get, key)
+            if value is not None:
+                return value
+            if time.time() > deadline:
+                return await compute()
+
+    def get_json(self, key):
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key, value, ttl=None):
+        self.set(key, json.dumps(value), ttl)
+
+    def get_or_compute_json(self, key, compute, ttl=None):
+        def compute_json():
+            result = compute()
+            return json.dumps(result) if result is not None else None
+        value = self.get_or_compute(key, compute_json, ttl)
+        return json.loads(value) if value is not None else None
+
+    async def get_or_compute_json_async(self, key, compute, ttl=None):
+        async def compute_json():
+            result = await compute()
+            return json.dumps(result) if result is not None else None
+        value = await self.get_or_compute_async(key, compute_json, ttl)
+        return json.loads(value) if value is not None else None
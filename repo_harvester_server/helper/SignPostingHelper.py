@@ -1,17 +1,26 @@
+import io
 import json
 import re
 from urllib.parse import urlparse, urljoin
 
-import requests
-from lxml import html
+from repo_harvester_server.helper import JsonStreamHelper
+from repo_harvester_server.helper.FetchHelper import FetchHelper
+from repo_harvester_server.helper.HarvestBudget import BudgetExceeded, track_stage
 
 class SignPostingHelper:
-    def __init__(self, url , html=None, headers=None):
+    def __init__(self, url , html=None, headers=None, fetcher=None, streaming=False, budget=None, linkset_json=None):
         self.url = url
+        self.fetcher = fetcher or FetchHelper()
+        self.streaming = streaming and JsonStreamHelper.is_streaming_available()
+        # optional HarvestBudget limiting document sizes and links taken from linksets
+        self.budget = budget
+        self.linkset_link_count = 0
+        # an already fetched application/linkset+json document, e.g. a content negotiated landing page
+        self.linkset_json = linkset_json
         if html is None or headers is None:
-            response = requests.get(self.url)
-            html = response.text
-            headers = response.headers
+            response = self.fetcher.get(self.url, budget=self.budget, truncate=True)
+            html = response.text if response is not None else None
+            headers = response.headers if response is not None else {}
         self.html = html
         self.headers = headers
         self.links = []
@@ -48,45 +57,107 @@ class SignPostingHelper:
         linksets = self.get_links('api-catalog')
         return linksets
 
+    def add_linkset_json_links(self, linkset):
+        if isinstance(linkset, dict):
+            print(linkset)
+            anchor = linkset.get('anchor')
+            for linktype, links in linkset.items():
+                if linktype != "anchor":
+                    if not isinstance(links, list):
+                        links = [links]
+                    for link in links:
+                        self._check_linkset_budget()
+                        liksetlink_dict = {
+                            "anchor": anchor,
+                            "link": link.get("href"),
+                            "type": link.get("type"),
+                            "rel": linktype,
+                            "profile": link.get("profile"),
+                            "title": link.get("title"),
+                        }
+                        self.links.append(liksetlink_dict)
+
+    def _check_linkset_budget(self):
+        if self.budget is not None and self.budget.max_linkset_links is not None:
+            if self.linkset_link_count >= self.budget.max_linkset_links:
+                self.budget.mark_truncated('max_linkset_links', self.budget.max_linkset_links)
+                raise BudgetExceeded('More than {} linkset links'.format(self.budget.max_linkset_links))
+        self.linkset_link_count += 1
+
     def set_linkset_links(self, linksets):
-        links = []
         for linksetlink in linksets:
             if linksetlink.get('type') == 'application/linkset+json':
-                response = requests.get(linksetlink.get('link'))
-                link_dict = response.json()
+                if self.streaming:
+                    # api-catalog linksets may list every dataset, so parse them entry by entry
+                    response = self.fetcher.get(linksetlink.get('link'), stream=True, budget=self.budget,
+                                                truncate=True)
+                    if response is None:
+                        continue
+                    try:
+                        for linkset in JsonStreamHelper.iter_linkset_items(response.raw):
+                            self.add_linkset_json_links(linkset)
+                    except BudgetExceeded:
+                        # keep the links read so far
+                        pass
+                    except Exception as e:
+                        print('Streaming linkset Error: ', e)
+                    finally:
+                        response.close()
+                    break
+                response = self.fetcher.get(linksetlink.get('link'), budget=self.budget, truncate=True)
+                if response is None:
+                    continue
+                try:
+                    link_dict = response.json()
+                except ValueError as e:
+                    # e.g. cut off at max_document_bytes, keep the complete linkset entries
+                    print('Loading linkset Error: ', e)
+                    link_dict = {'linkset': self._read_partial_linkset(response.content)}
                 if isinstance(link_dict.get('linkset'), list):
-                    for linkset in link_dict.get('linkset'):
-                        if isinstance(linkset, dict):
-                            print(linkset)
-                            for linktype, links in linkset.items():
-                                if linktype == "anchor":
-                                    anchor = links
-                                else:
-                                    if not isinstance(links, list):
-                                        links = [links]
-                                    for link in links:
-                                        liksetlink_dict = {
-                                            "anchor": anchor,
-                                            "link": link.get("href"),
-                                            "type": link.get("type"),
-                                            "rel": linktype,
-                                            "profile": link.get("profile"),
-                                            "title": link.get("title"),
-                                        }
-                                        self.links.append(liksetlink_dict)
+                    try:
+                        for linkset in link_dict.get('linkset'):
+                            self.add_linkset_json_links(linkset)
+                    except BudgetExceeded:
+                        pass
                 else:
                     print('Unexpected linkset type: ', type(link_dict.get('linkset')))
                 break
             elif linksetlink.get('type') == 'application/linkset':
-                response = requests.get(linksetlink.get('link'))
+                response = self.fetcher.get(linksetlink.get('link'), budget=self.budget, truncate=True)
+                if response is None:
+                    continue
                 link_string = response.text
-                self.links.extend(self.parse_link_string(link_string))
+                linkset_links = self.parse_link_string(link_string)
+                if self.budget is not None and self.budget.max_linkset_links is not None:
+                    allowed = max(0, self.budget.max_linkset_links - self.linkset_link_count)
+                    if len(linkset_links) > allowed:
+                        self.budget.mark_truncated('max_linkset_links', self.budget.max_linkset_links)
+                        linkset_links = linkset_links[:allowed]
+                    self.linkset_link_count += len(linkset_links)
+                self.links.extend(linkset_links)
             else:
                 print('Unknown Linkset Format', linksetlink.get('type'))
 
+    def _read_partial_linkset(self, content):
+        linksets = []
+        if JsonStreamHelper.is_streaming_available():
+            try:
+                for linkset in JsonStreamHelper.iter_linkset_items(io.BytesIO(content)):
+                    linksets.append(linkset)
+            except Exception:
+                pass
+        return linksets
+
     def set_links(self):
-        self.set_html_links()
-        self.set_header_links()
+        with track_stage(self.budget, 'signposting'):
+            self.set_html_links()
+            self.set_header_links()
+        if isinstance(self.linkset_json, dict) and isinstance(self.linkset_json.get('linkset'), list):
+            try:
+                for linkset in self.linkset_json.get('linkset'):
+                    self.add_linkset_json_links(linkset)
+            except BudgetExceeded:
+                pass
         self.set_linkset_links(self.get_linksets())
         self.set_linkset_links(self.get_api_linksets())
         unique_links =list({d["link"]: d for d in self.links}.values())
@@ -107,7 +178,8 @@ class SignPostingHelper:
         if isinstance(self.html, str):
             if self.html:
                 try:
-                    dom = html.fromstring(self.html.encode("utf8"))
+                    from lxml import html as lxml_html
+                    dom = lxml_html.fromstring(self.html.encode("utf8"))
                     links = dom.xpath("/*/head/link")
                     for link in links:
                         href = link.attrib.get("href")
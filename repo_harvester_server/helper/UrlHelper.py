@@ -0,0 +1,100 @@
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# redirects which may be remembered, temporary ones (302, 303, 307) can change with every request
+PERMANENT_REDIRECT_STATUSES = (301, 308)
+
+
+def normalize_url(url):
+    """
+    Returns a normalized form of an http(s) URL: lower case scheme and host, no default port,
+    no fragment and '/' as path of a bare host. Other values are returned stripped but unchanged.
+    """
+    url = str(url).strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+    netloc = parts.hostname.lower()
+    if ':' in netloc:
+        # IPv6 literal
+        netloc = '[{}]'.format(netloc)
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = '{}:{}'.format(netloc, port)
+    if parts.username:
+        userinfo = parts.username + (':' + parts.password if parts.password else '')
+        netloc = userinfo + '@' + netloc
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def is_permanent_redirect(history):
+    """
+    Returns True if every hop of a redirect chain (e.g. requests.Response.history) is a permanent redirect.
+    """
+    return bool(history) and all(getattr(hop, 'status_code', None) in PERMANENT_REDIRECT_STATUSES
+                                 for hop in history)
+
+
+class RedirectMemo:
+    """
+    Remembers where (normalized) URLs finally redirected to, so later harvests go to the
+    final location directly and aliases of a repository share one canonical URL.
+    Only permanent redirect chains should be remembered, see is_permanent_redirect().
+    With a SharedCache the memo is shared by all workers of a node.
+    """
+    def __init__(self, ttl=86400, cache=None, max_entries=100000):
+        self.ttl = ttl
+        self.cache = cache
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # normalized url -> (final url, expires)
+        self._urls = {}
+
+    def get(self, url):
+        url = normalize_url(url)
+        with self._lock:
+            entry = self._urls.get(url)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        if self.cache is not None:
+            final_url = self.cache.get_json('redirect:' + url)
+            if final_url is not None:
+                self._set(url, final_url)
+                return final_url
+        return None
+
+    def _set(self, url, final_url):
+        with self._lock:
+            if len(self._urls) >= self.max_entries:
+                now = time.monotonic()
+                self._urls = {k: v for k, v in self._urls.items() if v[1] > now}
+                if len(self._urls) >= self.max_entries:
+                    self._urls.clear()
+            self._urls[url] = (final_url, time.monotonic() + self.ttl)
+
+    def remember(self, urls, final_url):
+        """
+        Records that all urls (e.g. the requested URL and every hop of its redirect chain)
+        end up at final_url.
+        """
+        final_url = normalize_url(final_url)
+        for url in urls:
+            url = normalize_url(url)
+            if url != final_url:
+                self._set(url, final_url)
+                if self.cache is not None:
+                    self.cache.set_json('redirect:' + url, final_url, self.ttl)
+
+    def get_canonical_url(self, url):
+        url = normalize_url(url)
+        return self.get(url) or url
+
+
+# process wide memo used when a harvester does not get its own
+default_redirect_memo = RedirectMemo()
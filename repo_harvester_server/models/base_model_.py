@@ -7,8 +7,51 @@ from repo_harvester_server import util
 
 T = typing.TypeVar('T')
 
+# values of these types are copied as they are by the generated serializers
+_PRIMITIVE_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _to_dict_value(value):
+    """Converts a non primitive attribute value the same way Model.to_dict always did"""
+    if isinstance(value, list):
+        return [x.to_dict() if hasattr(x, "to_dict") else x for x in value]
+    elif hasattr(value, "to_dict"):
+        return value.to_dict()
+    elif isinstance(value, dict):
+        return {k: v.to_dict() if hasattr(v, "to_dict") else v
+                for k, v in value.items()}
+    return value
+
+
+def _compile_serializers(cls):
+    """Generates to_dict and to_json_dict functions for the swagger_types of a model class.
+
+    The attribute names are unrolled into straight line code once at class creation, so
+    serializing a model no longer walks swagger_types reflectively.
+    """
+    namespace = {'_PRIMITIVE_TYPES': _PRIMITIVE_TYPES, '_to_dict_value': _to_dict_value}
+    to_dict_lines = ['def to_dict(self):', '    result = {}']
+    to_json_lines = ['def to_json_dict(self, include_nulls=False):', '    result = {}']
+    for i, attr in enumerate(cls.swagger_types):
+        to_dict_lines += [
+            '    v = self.{}'.format(attr),
+            '    result[{!r}] = v if v.__class__ in _PRIMITIVE_TYPES else _to_dict_value(v)'.format(attr),
+        ]
+        to_json_lines += [
+            '    v = self.{}'.format(attr),
+            '    if v is not None or include_nulls:',
+            '        result[{!r}] = v'.format(cls.attribute_map[attr]),
+        ]
+    to_dict_lines.append('    return result')
+    to_json_lines.append('    return result')
+    exec('\n'.join(to_dict_lines), namespace)
+    exec('\n'.join(to_json_lines), namespace)
+    return namespace['to_dict'], namespace['to_json_dict']
+
 
 class Model(object):
+    __slots__ = ()
+
     # swaggerTypes: The key is attribute name and the
     # value is attribute type.
     swagger_types = {}
@@ -17,6 +60,11 @@ class Model(object):
     # value is json key in definition.
     attribute_map = {}
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.swagger_types:
+            cls._compiled_to_dict, cls._compiled_to_json_dict = _compile_serializers(cls)
+
     @classmethod
     def from_dict(cls: typing.Type[T], dikt) -> T:
         """Returns the dict as a model"""
@@ -27,6 +75,9 @@ class Model(object):
 
         :rtype: dict
         """
+        compiled = type(self).__dict__.get('_compiled_to_dict')
+        if compiled is not None:
+            return compiled(self)
         result = {}
 
         for attr, _ in six.iteritems(self.swagger_types):
@@ -49,6 +100,23 @@ class Model(object):
 
         return result
 
+    def to_json_dict(self, include_nulls=False):
+        """Returns the model properties as a dict keyed by the json names of the definition
+
+        :param include_nulls: Keep properties whose value is None.
+        :rtype: dict
+        """
+        compiled = type(self).__dict__.get('_compiled_to_json_dict')
+        if compiled is not None:
+            return compiled(self, include_nulls)
+        result = {}
+        for attr, _ in six.iteritems(self.swagger_types):
+            value = getattr(self, attr)
+            if value is None and not include_nulls:
+                continue
+            result[self.attribute_map[attr]] = value
+        return result
+
     def to_str(self):
         """Returns the string representation of the model
 
@@ -62,7 +130,9 @@ class Model(object):
 
     def __eq__(self, other):
         """Returns true if both objects are equal"""
-        return self.__dict__ == other.__dict__
+        if type(self) is not type(other):
+            return False
+        return self.to_dict() == other.to_dict()
 
     def __ne__(self, other):
         """Returns true if both objects are not equal"""
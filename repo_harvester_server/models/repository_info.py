@@ -14,6 +14,24 @@ class RepositoryInfo(Model):
 
     Do not edit the class manually.
     """
+    __slots__ = ('_repo_uri', '_re3data_id', '_metadata', '_services', '_policies')
+
+    swagger_types = {
+        'repo_uri': str,
+        're3data_id': str,
+        'metadata': Dict,
+        'services': Dict,
+        'policies': Dict
+    }
+
+    attribute_map = {
+        'repo_uri': 'repoURI',
+        're3data_id': 're3dataID',
+        'metadata': 'metadata',
+        'services': 'services',
+        'policies': 'policies'
+    }
+
     def __init__(self, repo_uri: str=None, re3data_id: str=None, metadata: Dict=None, services: Dict=None, policies: Dict=None):  # noqa: E501
         """RepositoryInfo - a model defined in Swagger
 
@@ -28,21 +46,6 @@ class RepositoryInfo(Model):
         :param policies: The policies of this RepositoryInfo.  # noqa: E501
         :type policies: Dict
         """
-        self.swagger_types = {
-            'repo_uri': str,
-            're3data_id': str,
-            'metadata': Dict,
-            'services': Dict,
-            'policies': Dict
-        }
-
-        self.attribute_map = {
-            'repo_uri': 'repoURI',
-            're3data_id': 're3dataID',
-            'metadata': 'metadata',
-            'services': 'services',
-            'policies': 'policies'
-        }
         self._repo_uri = repo_uri
         self._re3data_id = re3data_id
         self._metadata = metadata
@@ -0,0 +1,123 @@
+import random
+
+# Synthetic schema.org / DCAT catalogs for scaling tests of the JSON-LD extraction.
+
+BASE = 'https://synthetic.example.org/'
+
+VOCABULARIES = {
+    'schema': {
+        '@context': {'@vocab': 'https://schema.org/'},
+        'catalog': 'DataCatalog',
+        'container': 'Collection',
+        'dataset': 'Dataset',
+        'distribution': 'DataDownload',
+        'service': 'Service',
+        'title': 'name',
+        'description': 'description',
+        'has_part': 'hasPart',
+        'has_dataset': 'dataset',
+        'has_distribution': 'distribution',
+        'has_service': 'hasPart',
+        'endpoint': 'url',
+        'conforms_to': 'termsOfService',
+        'related': 'isRelatedTo',
+        'publisher': 'publisher',
+        'organization': 'Organization',
+    },
+    'dcat': {
+        '@context': {'dcat': 'http://www.w3.org/ns/dcat#', 'dct': 'http://purl.org/dc/terms/',
+                     'foaf': 'http://xmlns.com/foaf/0.1/'},
+        'catalog': 'dcat:Catalog',
+        'container': 'dcat:Resource',
+        'dataset': 'dcat:Dataset',
+        'distribution': 'dcat:Distribution',
+        'service': 'dcat:DataService',
+        'title': 'dct:title',
+        'description': 'dct:description',
+        'has_part': 'dct:hasPart',
+        'has_dataset': 'dcat:dataset',
+        'has_distribution': 'dcat:distribution',
+        'has_service': 'dcat:service',
+        'endpoint': 'dcat:endpointURL',
+        'conforms_to': 'dct:conformsTo',
+        'related': 'dct:relation',
+        'publisher': 'dct:publisher',
+        'organization': 'foaf:Organization',
+    },
+}
+
+
+def _ref(node_id):
+    return {'@id': node_id}
+
+
+def generate_catalog(datasets=100, distributions=2, services=3, depth=1, cycles=0, vocabulary='schema', seed=0):
+    """
+    Returns a flattened JSON-LD catalog document (a dict with @context and @graph).
+
+    :param datasets: number of datasets
+    :param distributions: number of distributions per dataset
+    :param services: number of data services
+    :param depth: number of (non catalog) container levels between the catalog and its datasets and
+        services, i.e. how far _is_in_catalog_path has to walk up
+    :param cycles: number of extra relation links from datasets to other datasets and to services,
+        which create cycles and nodes with many parents
+    :param vocabulary: 'schema' (schema.org) or 'dcat'
+    :param seed: random seed for the cycle links
+    """
+    v = VOCABULARIES[vocabulary]
+    rng = random.Random(seed)
+    graph = []
+    catalog = {
+        '@id': BASE + 'catalog',
+        '@type': v['catalog'],
+        v['title']: 'Synthetic catalog',
+        v['description']: 'A synthetic catalog with {} datasets'.format(datasets),
+        v['publisher']: _ref(BASE + 'publisher'),
+    }
+    graph.append(catalog)
+    graph.append({'@id': BASE + 'publisher', '@type': v['organization'], v['title']: 'Synthetic publisher'})
+
+    parent = catalog
+    for level in range(depth):
+        container = {'@id': BASE + 'container/{}'.format(level), '@type': v['container'],
+                     v['title']: 'Level {}'.format(level)}
+        parent.setdefault(v['has_part'], []).append(_ref(container['@id']))
+        graph.append(container)
+        parent = container
+
+    dataset_ids = []
+    for i in range(datasets):
+        dataset_id = BASE + 'dataset/{}'.format(i)
+        dataset_ids.append(dataset_id)
+        dataset = {'@id': dataset_id, '@type': v['dataset'], v['title']: 'Dataset {}'.format(i),
+                   v['has_distribution']: []}
+        for j in range(distributions):
+            distribution_id = dataset_id + '/distribution/{}'.format(j)
+            dataset[v['has_distribution']].append(_ref(distribution_id))
+            graph.append({'@id': distribution_id, '@type': v['distribution'],
+                          v['endpoint']: _ref(distribution_id + '/download')})
+        parent.setdefault(v['has_dataset'], []).append(_ref(dataset_id))
+        graph.append(dataset)
+
+    service_ids = []
+    for i in range(services):
+        service_id = BASE + 'service/{}'.format(i)
+        service_ids.append(service_id)
+        graph.append({'@id': service_id, '@type': v['service'], v['title']: 'Service {}'.format(i),
+                      v['endpoint']: _ref(BASE + 'api/{}'.format(i)),
+                      v['conforms_to']: _ref('https://www.openarchives.org/OAI/2.0/')})
+        parent.setdefault(v['has_service'], []).append(_ref(service_id))
+
+    nodes = {node['@id']: node for node in graph}
+    targets = dataset_ids + service_ids
+    if dataset_ids and targets:
+        for _ in range(cycles):
+            source = nodes[rng.choice(dataset_ids)]
+            source.setdefault(v['related'], []).append(_ref(rng.choice(targets)))
+
+    return {'@context': v['@context'], '@graph': graph}
+
+
+def count_nodes(jsonld):
+    return len(jsonld.get('@graph', []))
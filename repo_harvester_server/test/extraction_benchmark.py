@@ -0,0 +1,147 @@
+import argparse
+import contextlib
+import csv
+import io
+import math
+import sys
+import time
+import tracemalloc
+
+import rdflib
+from rdflib import RDF, DCAT, SDO
+
+from repo_harvester_server.helper.MetadataHelper import MetadataHelper
+from repo_harvester_server.test.catalog_generator import generate_catalog
+
+# Scaling benchmark of the JSON-LD extraction stages on synthetic catalogs.
+# For every catalog size the extraction time and peak memory of each stage is measured and
+# the log-log slope against the number of triples is reported: ~1 is linear, >1 superlinear.
+# Services and checked catalog path nodes grow with the number of datasets, so all stages scale
+# with the catalog; their time per service and per node is reported as well. Time and memory
+# are measured in separate runs, tracing allocations slows the timed code down considerably.
+#
+#   python -m repo_harvester_server.test.extraction_benchmark --sizes 10,100,1000,10000 --csv out.csv --plot out.png
+
+STAGES = ['parse', 'descriptive', 'services', 'catalog_path']
+
+
+def measure_time(func):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    return result, time.perf_counter() - start
+
+
+def measure_peak(func):
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure(row, stage, func):
+    # untraced timing run first, its result is returned, then a second run for the peak memory
+    result, row[stage + '_s'] = measure_time(func)
+    row[stage + '_peak_bytes'] = measure_peak(func)
+    return result
+
+
+def run(size, args, helper):
+    services = args.services if args.services is not None else max(1, round(size * args.services_per_dataset))
+    jsonld = generate_catalog(datasets=size, distributions=args.distributions, services=services,
+                              depth=args.depth, cycles=int(size * args.cycles), vocabulary=args.vocabulary)
+    row = {'datasets': size, 'services': services}
+    graph = measure(row, 'parse', lambda: rdflib.ConjunctiveGraph().parse(data=jsonld, format='json-ld'))
+    row['triples'] = len(graph)
+    measure(row, 'descriptive', lambda: helper._get_jsonld_descriptive_metadata(graph))
+    measure(row, 'services', lambda: helper._get_jsonld_service_metadata(graph))
+    row['services_per_service_s'] = row['services_s'] / services
+    # deepest nodes of the catalog: all datasets' distributions need the longest walk upwards
+    nodes = list(graph.subjects(RDF.type, SDO.DataDownload)) + list(graph.subjects(RDF.type, DCAT.Distribution))
+    nodes = nodes[:max(1, round(len(nodes) * args.path_fraction))]
+    measure(row, 'catalog_path', lambda: [helper._is_in_catalog_path(graph, node) for node in nodes])
+    row['catalog_path_nodes'] = len(nodes)
+    row['catalog_path_per_node_s'] = row['catalog_path_s'] / max(1, len(nodes))
+    return row
+
+
+def slope(rows, stage):
+    # log-log slope of time against triples between the two largest sizes
+    if len(rows) < 2:
+        return None
+    a, b = rows[-2], rows[-1]
+    ta, tb = a[stage + '_s'], b[stage + '_s']
+    if ta <= 0 or tb <= 0 or a['triples'] == b['triples']:
+        return None
+    return math.log(tb / ta) / math.log(b['triples'] / a['triples'])
+
+
+def plot(rows, path):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print('matplotlib is not installed, skipping plot')
+        return
+    triples = [row['triples'] for row in rows]
+    fig, (time_ax, memory_ax) = plt.subplots(1, 2, figsize=(12, 5))
+    for stage in STAGES:
+        time_ax.loglog(triples, [row[stage + '_s'] for row in rows], marker='o', label=stage)
+        memory_ax.loglog(triples, [row[stage + '_peak_bytes'] for row in rows], marker='o', label=stage)
+    time_ax.set_xlabel('triples')
+    time_ax.set_ylabel('seconds')
+    memory_ax.set_xlabel('triples')
+    memory_ax.set_ylabel('peak traced bytes')
+    time_ax.legend()
+    memory_ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    print('Plot written to', path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10,100,1000,5000', help='comma separated numbers of datasets')
+    parser.add_argument('--distributions', type=int, default=2)
+    parser.add_argument('--services', type=int, help='fixed number of services instead of --services-per-dataset')
+    parser.add_argument('--services-per-dataset', type=float, default=0.05)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--cycles', type=float, default=0.1, help='relation links per dataset')
+    parser.add_argument('--vocabulary', choices=['schema', 'dcat'], default='schema')
+    parser.add_argument('--path-fraction', type=float, default=0.1,
+                        help='fraction of the distribution nodes checked with _is_in_catalog_path')
+    parser.add_argument('--csv', help='write the results to this CSV file')
+    parser.add_argument('--plot', help='write a time and memory plot to this image file (needs matplotlib)')
+    args = parser.parse_args(argv)
+
+    helper = MetadataHelper()
+    rows = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        rows.append(run(size, args, helper))
+        row = rows[-1]
+        print('datasets={datasets} triples={triples} '.format(**row) + ' '.join(
+            '{}={:.4f}s/{:.1f}MB'.format(stage, row[stage + '_s'], row[stage + '_peak_bytes'] / 1e6)
+            for stage in STAGES) + ' service_count={} per_service={:.6f}s path_nodes={} per_node={:.6f}s'.format(
+            row['services'], row['services_per_service_s'], row['catalog_path_nodes'],
+            row['catalog_path_per_node_s']))
+    for stage in STAGES:
+        stage_slope = slope(rows, stage)
+        if stage_slope is not None:
+            print('{}: time grows with triples^{:.2f}{}'.format(
+                stage, stage_slope, ' (superlinear)' if stage_slope > 1.2 else ''))
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.plot:
+        plot(rows, args.plot)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
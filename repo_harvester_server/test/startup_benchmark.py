@@ -0,0 +1,37 @@
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures the cold start of a fresh interpreter for the server and helper modules,
+# and the cost of the optional warm up hook.
+
+RUNS = 5
+
+SNIPPETS = {
+    'import helpers': 'import repo_harvester_server.helper.RepositoryHarvester',
+    'import helpers + warm up': 'from repo_harvester_server.helper.MetadataHelper import warm_up; warm_up()',
+    'create_app': 'from repo_harvester_server.__main__ import create_app; create_app(warm_up=False)',
+    'create_app + warm up': 'from repo_harvester_server.__main__ import create_app; create_app(warm_up=True)',
+}
+
+
+def time_snippet(snippet):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', snippet], capture_output=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None, result.stderr.decode(errors='replace').strip().splitlines()[-1]
+    return statistics.median(timings), None
+
+
+baseline, _ = time_snippet('pass')
+print('interpreter start up: {:.3f}s'.format(baseline))
+for name, snippet in SNIPPETS.items():
+    median, error = time_snippet(snippet)
+    if error:
+        print('{}: failed ({})'.format(name, error))
+    else:
+        print('{}: {:.3f}s (+{:.3f}s)'.format(name, median, median - baseline))
@@ -0,0 +1,137 @@
+import unittest
+from unittest import mock
+
+from repo_harvester_server.helper.CircuitBreaker import CircuitBreaker, NegativeCache
+from repo_harvester_server.helper.FetchHelper import BufferedResponse, FetchHelper
+from repo_harvester_server.helper.HostScheduler import HostScheduler
+
+
+class TestNegativeCache(unittest.TestCase):
+
+    def test_failure_blocks_url(self):
+        cache = NegativeCache(base_backoff=60)
+        self.assertFalse(cache.is_blocked('http://a.example/x'))
+        cache.record_failure('http://a.example/x')
+        self.assertTrue(cache.is_blocked('http://a.example/x'))
+        self.assertFalse(cache.is_blocked('http://a.example/y'))
+
+    def test_backoff_grows_exponentially_up_to_max(self):
+        cache = NegativeCache(base_backoff=10, max_backoff=35)
+        backoffs = [cache.record_failure('http://a.example/x') for _ in range(4)]
+        self.assertEqual(backoffs, [10, 20, 35, 35])
+
+    def test_success_unblocks_url(self):
+        cache = NegativeCache()
+        cache.record_failure('http://a.example/x')
+        cache.record_success('http://a.example/x')
+        self.assertFalse(cache.is_blocked('http://a.example/x'))
+        self.assertEqual(cache.record_failure('http://a.example/x'), cache.base_backoff)
+
+    def test_expired_entry_is_not_blocked(self):
+        cache = NegativeCache(base_backoff=0)
+        cache.record_failure('http://a.example/x')
+        self.assertFalse(cache.is_blocked('http://a.example/x'))
+
+    def test_oldest_entries_are_dropped(self):
+        cache = NegativeCache(max_entries=2)
+        for url in ('http://a.example/1', 'http://a.example/2', 'http://a.example/3'):
+            cache.record_failure(url)
+        self.assertFalse(cache.is_blocked('http://a.example/1'))
+        self.assertTrue(cache.is_blocked('http://a.example/3'))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=300)
+        breaker.record_failure('http://a.example/x')
+        self.assertTrue(breaker.allow('http://a.example/y'))
+        breaker.record_failure('http://a.example/y')
+        self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow('http://a.example/z'))
+        self.assertTrue(breaker.allow('http://b.example/'))
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure('http://a.example/x')
+        breaker.record_success('http://a.example/x')
+        breaker.record_failure('http://a.example/x')
+        self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.CLOSED)
+
+    def test_single_probe_when_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure('http://a.example/x')
+        self.assertTrue(breaker.allow('http://a.example/x'))
+        self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow('http://a.example/y'))
+
+    def test_probe_success_closes(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure('http://a.example/x')
+        breaker.allow('http://a.example/x')
+        breaker.record_success('http://a.example/x')
+        self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.CLOSED)
+
+    def test_probe_failure_opens_again(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=300)
+        for _ in range(3):
+            breaker.record_failure('http://a.example/x')
+        with mock.patch('repo_harvester_server.helper.CircuitBreaker.time.monotonic', return_value=1e12):
+            self.assertTrue(breaker.allow('http://a.example/x'))
+            breaker.record_failure('http://a.example/x')
+            self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.OPEN)
+            self.assertFalse(breaker.allow('http://a.example/x'))
+
+    def test_release_without_outcome_allows_next_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure('http://a.example/x')
+        breaker.allow('http://a.example/x')
+        breaker.release('http://a.example/x')
+        self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.OPEN)
+        self.assertTrue(breaker.allow('http://a.example/y'))
+
+    def test_release_keeps_closed_host_closed(self):
+        breaker = CircuitBreaker()
+        breaker.release('http://a.example/x')
+        self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.CLOSED)
+
+
+class _DisallowingScheduler(HostScheduler):
+    def can_fetch(self, url):
+        return not url.endswith('/private')
+
+
+class _StatusFetchHelper(FetchHelper):
+    def __init__(self, statuses, **kwargs):
+        super().__init__(**kwargs)
+        self.statuses = list(statuses)
+
+    def _send(self, url, headers=None, stream=False):
+        return BufferedResponse(url, self.statuses.pop(0), {}, 'utf-8', b'')
+
+
+class TestFetchHelperCircuitBreaker(unittest.TestCase):
+
+    def test_disallowed_probe_does_not_block_host(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        fetcher = _StatusFetchHelper([500, 500, 200], scheduler=_DisallowingScheduler(min_delay=0),
+                                     circuit_breaker=breaker)
+        self.assertIsNone(fetcher.get('http://a.example/1'))
+        self.assertIsNone(fetcher.get('http://a.example/2'))
+        self.assertIsNone(fetcher.get('http://a.example/private'))
+        self.assertNotEqual(breaker.get_state('http://a.example/'), CircuitBreaker.HALF_OPEN)
+        response = fetcher.get('http://a.example/3')
+        self.assertIsNotNone(response)
+        self.assertEqual(breaker.get_state('http://a.example/'), CircuitBreaker.CLOSED)
+
+    def test_failures_fill_negative_cache(self):
+        cache = NegativeCache()
+        fetcher = _StatusFetchHelper([503], negative_cache=cache)
+        self.assertIsNone(fetcher.get('http://a.example/x'))
+        self.assertTrue(cache.is_blocked('http://a.example/x'))
+        # blocked URLs fail fast without a request
+        self.assertIsNone(fetcher.get('http://a.example/x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import json
+import unittest
+
+import requests
+
+from repo_harvester_server.helper import JsonStreamHelper
+from repo_harvester_server.helper.FetchHelper import FetchHelper
+from repo_harvester_server.helper.HarvestBudget import BudgetExceeded, HarvestBudget
+from repo_harvester_server.helper.MetadataHelper import MetadataHelper
+from repo_harvester_server.helper.SignPostingHelper import SignPostingHelper
+
+
+class _Raw(io.BytesIO):
+    """urllib3 like raw body which accepts the decode_content flag"""
+
+
+class _BodyFetchHelper(FetchHelper):
+    """Answers every request with a fixed body"""
+    def __init__(self, bodies, **kwargs):
+        super().__init__(**kwargs)
+        # url -> (Content-Type, body)
+        self.bodies = bodies
+
+    def _send(self, url, headers=None, stream=False):
+        content_type, body = self.bodies[url]
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response.headers['Content-Type'] = content_type
+        response.raw = _Raw(body)
+        return response
+
+
+class TestDocumentLimit(unittest.TestCase):
+
+    def test_limit_chunks_truncates(self):
+        budget = HarvestBudget(max_document_bytes=5)
+        self.assertEqual(b''.join(budget.limit_chunks([b'abc', b'def', b'ghi'], 'u', truncate=True)), b'abcde')
+        self.assertTrue(budget.is_document_truncated('u'))
+        with self.assertRaises(BudgetExceeded):
+            b''.join(budget.limit_chunks([b'abc', b'def'], 'u'))
+
+    def test_limit_reader_truncates(self):
+        budget = HarvestBudget(max_document_bytes=5)
+        reader = budget.limit_reader(io.BytesIO(b'abcdefgh'), 'u', truncate=True)
+        self.assertEqual(reader.read(3) + reader.read(3) + reader.read(3), b'abcde')
+
+    def test_oversized_page_is_dropped_or_truncated(self):
+        fetcher = _BodyFetchHelper({'http://a.example/': ('text/html', b'<html>' + b'x' * 200)})
+        budget = HarvestBudget(max_document_bytes=100)
+        self.assertIsNone(fetcher.get('http://a.example/', budget=budget))
+        response = fetcher.get('http://a.example/', budget=budget, truncate=True)
+        self.assertEqual(len(response.content), 100)
+        self.assertTrue(response.truncated)
+        self.assertEqual(budget.truncated, [{'limit': 'max_document_bytes', 'value': 100, 'url': 'http://a.example/'}])
+
+    @unittest.skipUnless(JsonStreamHelper.is_streaming_available(), 'ijson is not installed')
+    def test_truncated_linkset_keeps_complete_entries(self):
+        linkset = {'linkset': [{'anchor': 'http://a.example/', 'describedby': [{'href': 'http://a.example/%d' % i,
+                                                                                'type': 'application/ld+json'}]}
+                               for i in range(20)]}
+        body = json.dumps(linkset).encode('utf-8')
+        fetcher = _BodyFetchHelper({'http://a.example/linkset': ('application/linkset+json', body)})
+        budget = HarvestBudget(max_document_bytes=len(body) // 2)
+        helper = SignPostingHelper('http://a.example/', '', {
+            'Link': '<http://a.example/linkset>; rel="linkset"; type="application/linkset+json"'},
+            fetcher=fetcher, budget=budget)
+        links = helper.get_links('describedby')
+        self.assertTrue(0 < len(links) < 20)
+        self.assertTrue(budget.is_document_truncated('http://a.example/linkset'))
+
+
+class TestTrackedStages(unittest.TestCase):
+
+    def test_parsing_stages_are_traced(self):
+        budget = HarvestBudget(trace_memory=True)
+        html = '<script type="application/ld+json">{}</script>'.format(json.dumps(
+            {'@context': {'@vocab': 'https://schema.org/'}, '@id': 'http://x/', '@type': 'DataCatalog'}))
+        MetadataHelper(budget=budget).get_embedded_jsonld_metadata(html)
+        self.assertIn('embedded_jsonld', budget.memory_report)
+
+
+if __name__ == '__main__':
+    unittest.main()
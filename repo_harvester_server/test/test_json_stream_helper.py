@@ -0,0 +1,52 @@
+import io
+import json
+import unittest
+
+from repo_harvester_server.helper import JsonStreamHelper
+
+
+def _load(document):
+    return JsonStreamHelper.load_pruned_jsonld(io.BytesIO(json.dumps(document).encode('utf-8')))
+
+
+@unittest.skipUnless(JsonStreamHelper.is_streaming_available(), 'ijson is not installed')
+class TestLoadPrunedJsonld(unittest.TestCase):
+
+    def test_graph_datasets_are_dropped(self):
+        document = {'@context': {'@vocab': 'https://schema.org/'}, '@graph': [
+            {'@id': 'c', '@type': 'DataCatalog', 'name': 'C', 'dataset': [{'@id': 'd1'}]},
+            {'@id': 'd1', '@type': 'Dataset'},
+        ]}
+        self.assertEqual(_load(document), {'@context': {'@vocab': 'https://schema.org/'}, '@graph': [
+            {'@id': 'c', '@type': 'DataCatalog', 'name': 'C'},
+        ]})
+
+    def test_catalog_also_typed_dataset_is_kept(self):
+        document = {'@graph': [{'@id': 'c', '@type': ['Dataset', 'DataCatalog']},
+                               {'@id': 's', '@type': ['Dataset', 'Service']},
+                               {'@id': 'd', '@type': 'Dataset'}]}
+        self.assertEqual([node['@id'] for node in _load(document)['@graph']], ['c', 's'])
+
+    def test_top_level_node_array_is_pruned(self):
+        # flattened and expanded documents are arrays of nodes
+        document = [
+            {'@id': 'c', '@type': ['http://www.w3.org/ns/dcat#Catalog'],
+             'http://www.w3.org/ns/dcat#dataset': [{'@id': 'd1'}, {'@id': 'd2'}]},
+            {'@id': 'd1', '@type': ['http://www.w3.org/ns/dcat#Dataset']},
+            {'@id': 'd2', '@type': ['https://schema.org/Dataset']},
+        ]
+        self.assertEqual(_load(document), [{'@id': 'c', '@type': ['http://www.w3.org/ns/dcat#Catalog']}])
+
+    def test_nested_graph_is_pruned(self):
+        document = {'@context': {}, '@id': 'g', '@graph': [
+            {'@id': 'named', '@graph': [{'@id': 'c', '@type': 'DataCatalog'}, {'@id': 'd', '@type': 'Dataset'}]},
+        ]}
+        self.assertEqual(_load(document)['@graph'][0]['@graph'], [{'@id': 'c', '@type': 'DataCatalog'}])
+
+    def test_plain_value_arrays_are_kept(self):
+        document = {'@graph': [{'@id': 'c', '@type': 'DataCatalog', 'keywords': ['Dataset', 'a']}]}
+        self.assertEqual(_load(document), document)
+
+
+if __name__ == '__main__':
+    unittest.main()
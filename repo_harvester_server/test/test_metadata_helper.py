@@ -0,0 +1,84 @@
+import socket
+import unittest
+from unittest import mock
+
+from repo_harvester_server.helper import MetadataHelper as metadata_helper_module
+from repo_harvester_server.helper.AsyncFetchHelper import PrefetchedFetcher
+from repo_harvester_server.helper.FetchHelper import FetchHelper
+from repo_harvester_server.helper.MetadataHelper import MetadataHelper
+
+
+class _OfflineFetchHelper(FetchHelper):
+    """Fails every request like an unreachable host"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requested = []
+
+    def _send(self, url, headers=None, stream=False):
+        import requests
+        self.requested.append(url)
+        raise requests.ConnectionError('offline')
+
+
+class TestRemoteJsonldContexts(unittest.TestCase):
+
+    def setUp(self):
+        metadata_helper_module._jsonld_context_cache.clear()
+        metadata_helper_module._jsonld_context_failures.clear()
+        # any connection which does not go through FetchHelper, e.g. rdflib's own document loader
+        patcher = mock.patch.object(socket, 'create_connection', side_effect=OSError('no network in tests'))
+        self.create_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        metadata_helper_module._jsonld_context_cache.clear()
+        metadata_helper_module._jsonld_context_failures.clear()
+
+    def test_unavailable_context_fails_document_without_rdflib_download(self):
+        fetcher = _OfflineFetchHelper()
+        helper = MetadataHelper(fetcher=fetcher)
+        document = {'@context': 'http://contexts.example/ctx', '@id': 'http://x/', '@type': 'DataCatalog'}
+        with self.assertRaises(ValueError):
+            helper.get_jsonld_metadata(dict(document))
+        # within the retry period the context is neither fetched again nor left to rdflib
+        with self.assertRaises(ValueError):
+            helper.get_jsonld_metadata(dict(document))
+        self.assertEqual(fetcher.requested, ['http://contexts.example/ctx'])
+        self.create_connection.assert_not_called()
+
+    def test_unavailable_nested_context_fails_document(self):
+        helper = MetadataHelper(fetcher=_OfflineFetchHelper())
+        document = {'@graph': [{'@context': ['http://contexts.example/ctx'], '@id': 'http://x/'}]}
+        with self.assertRaises(ValueError):
+            helper.get_jsonld_metadata(document)
+        self.create_connection.assert_not_called()
+
+    def test_unavailable_schemaorg_context_uses_fallback(self):
+        helper = MetadataHelper(fetcher=_OfflineFetchHelper())
+        metadata = helper.get_jsonld_metadata({'@context': 'https://schema.org/', '@id': 'http://x/',
+                                               '@type': 'DataCatalog', 'name': 'Catalog'})
+        self.assertEqual(metadata.get('title'), 'Catalog')
+        self.create_connection.assert_not_called()
+
+    def test_pending_context_defers_document(self):
+        fetcher = PrefetchedFetcher()
+        helper = MetadataHelper(fetcher=fetcher)
+        with self.assertRaises(ValueError):
+            helper.get_jsonld_metadata({'@context': 'https://schema.org/', '@id': 'http://x/',
+                                        '@type': 'DataCatalog', 'name': 'Catalog'})
+        # neither the fallback nor rdflib, the next async pass parses the document with the fetched context
+        self.assertTrue(fetcher.is_pending('https://schema.org/docs/jsonldcontext.jsonld'))
+        self.assertNotIn('https://schema.org/docs/jsonldcontext.jsonld', metadata_helper_module._jsonld_context_failures)
+        self.create_connection.assert_not_called()
+
+    def test_failed_context_is_retried_after_retry_period(self):
+        fetcher = _OfflineFetchHelper()
+        helper = MetadataHelper(fetcher=fetcher)
+        with mock.patch.object(metadata_helper_module, 'JSONLD_CONTEXT_RETRY', 0):
+            self.assertIsNone(helper.get_remote_jsonld_context('http://contexts.example/ctx'))
+            self.assertIsNone(helper.get_remote_jsonld_context('http://contexts.example/ctx'))
+        self.assertEqual(len(fetcher.requested), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
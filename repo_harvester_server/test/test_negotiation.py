@@ -0,0 +1,60 @@
+import unittest
+
+from repo_harvester_server.helper.FetchHelper import BufferedResponse, FetchHelper
+from repo_harvester_server.helper.NegotiationHelper import NEGOTIATION_ACCEPT, NegotiationMemo
+from repo_harvester_server.helper.RepositoryHarvester import CatalogMetadataHarvester
+from repo_harvester_server.helper.UrlHelper import RedirectMemo
+
+
+class _PageFetchHelper(FetchHelper):
+    """Answers every request with an HTML page of the given status"""
+    def __init__(self, status_code, **kwargs):
+        super().__init__(**kwargs)
+        self.status_code = status_code
+        self.requested_headers = []
+
+    def _send(self, url, headers=None, stream=False):
+        self.requested_headers.append(headers)
+        return BufferedResponse(url, self.status_code, {'Content-Type': 'text/html'}, 'utf-8',
+                                b'<html><head><title>Page</title></head></html>')
+
+
+class TestNegotiationMemo(unittest.TestCase):
+
+    def test_unknown_host_is_negotiated(self):
+        self.assertEqual(NegotiationMemo().get_request_headers('http://a.example/')['Accept'], NEGOTIATION_ACCEPT)
+
+    def test_remembered_representation_is_asked_for(self):
+        memo = NegotiationMemo()
+        memo.remember('http://a.example/', 'jsonld')
+        self.assertTrue(memo.get_request_headers('http://a.example/x')['Accept'].startswith('application/ld+json'))
+
+    def test_html_host_gets_plain_request(self):
+        memo = NegotiationMemo()
+        memo.remember('http://a.example/', 'html')
+        self.assertIsNone(memo.get_request_headers('http://a.example/x'))
+
+
+class TestHarvesterNegotiation(unittest.TestCase):
+
+    def _harvest(self, fetcher, memo):
+        harvester = CatalogMetadataHarvester('http://a.example/', fetcher=fetcher, negotiate=True,
+                                             negotiation_memo=memo, redirect_memo=RedirectMemo())
+        harvester.harvest_self_hosted_metadata()
+
+    def test_html_page_is_remembered(self):
+        memo = NegotiationMemo()
+        fetcher = _PageFetchHelper(200)
+        self._harvest(fetcher, memo)
+        self.assertEqual(memo.get('http://a.example/'), 'html')
+        self._harvest(fetcher, memo)
+        self.assertIsNone(fetcher.requested_headers[-1])
+
+    def test_error_page_is_not_remembered(self):
+        memo = NegotiationMemo()
+        self._harvest(_PageFetchHelper(404), memo)
+        self.assertIsNone(memo.get('http://a.example/'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from repo_harvester_server.helper.FetchHelper import BufferedResponse, FetchHelper
+from repo_harvester_server.helper.RepositoryHarvester import CatalogMetadataHarvester
+from repo_harvester_server.helper.SharedCache import SharedCache
+from repo_harvester_server.helper.UrlHelper import RedirectMemo, is_permanent_redirect
+
+_PAGE = '<html><head><script type="application/ld+json">{}</script></head></html>'.format(json.dumps(
+    {'@context': {'@vocab': 'https://schema.org/'}, '@id': 'http://a.example/', '@type': 'DataCatalog',
+     'name': 'Catalog'}))
+
+
+class _RedirectingFetchHelper(FetchHelper):
+    """Answers every request with a catalog page reached through redirects"""
+    def __init__(self, redirects, **kwargs):
+        super().__init__(**kwargs)
+        # requested url -> (final url, [status of every hop])
+        self.redirects = redirects
+
+    def _send(self, url, headers=None, stream=False):
+        final_url, statuses = self.redirects.get(url, (url, []))
+        response = BufferedResponse(final_url, 200, {'Content-Type': 'text/html'}, 'utf-8', _PAGE.encode('utf-8'))
+        response.history = [BufferedResponse(url, status) for status in statuses]
+        return response
+
+
+class TestIsPermanentRedirect(unittest.TestCase):
+
+    def test_permanent_chain(self):
+        self.assertTrue(is_permanent_redirect([BufferedResponse('http://a/', 301), BufferedResponse('http://b/', 308)]))
+
+    def test_temporary_hop_makes_chain_temporary(self):
+        self.assertFalse(is_permanent_redirect([BufferedResponse('http://a/', 301), BufferedResponse('http://b/', 302)]))
+
+    def test_no_redirect(self):
+        self.assertFalse(is_permanent_redirect([]))
+
+
+class TestHarvesterRedirects(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache = SharedCache(os.path.join(self.tmp_dir, 'cache.sqlite'))
+        self.memo = RedirectMemo()
+
+    def _harvest(self, url, fetcher):
+        harvester = CatalogMetadataHarvester(url, fetcher=fetcher, cache=self.cache, redirect_memo=self.memo)
+        harvester.harvest_self_hosted_metadata()
+        return harvester
+
+    def test_temporary_redirects_are_neither_remembered_nor_shared(self):
+        fetcher = _RedirectingFetchHelper({'http://a.example/repoA': ('http://a.example/login', [302]),
+                                           'http://a.example/repoB': ('http://a.example/login', [302])})
+        self._harvest('http://a.example/repoA', fetcher)
+        self.assertIsNone(self.memo.get('http://a.example/repoA'))
+        self.assertIsNone(self.cache.get_json('harvest:http://a.example/login'))
+        harvester = self._harvest('http://a.example/repoB', fetcher)
+        self.assertEqual(harvester.metadata.get('title'), 'Catalog')
+        self.assertIsNone(self.memo.get('http://a.example/repoB'))
+        self.assertIsNotNone(self.cache.get_json('harvest:http://a.example/repoB'))
+
+    def test_permanent_redirects_share_canonical_url(self):
+        fetcher = _RedirectingFetchHelper({'http://a.example/old': ('http://a.example/new', [301, 308])})
+        self._harvest('http://a.example/old', fetcher)
+        self.assertEqual(self.memo.get('http://a.example/old'), 'http://a.example/new')
+        self.assertEqual(self.cache.get_json('harvest:http://a.example/new').get('title'), 'Catalog')
+
+    def test_cached_documents_keep_redirect_statuses(self):
+        fetcher = _RedirectingFetchHelper({'http://a.example/x': ('http://a.example/y', [302])}, cache=self.cache)
+        fetcher.get('http://a.example/x')
+        response = fetcher.get('http://a.example/x')
+        self.assertEqual([hop.status_code for hop in response.history], [302])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from repo_harvester_server.helper.SharedCache import SharedCache
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'cache.sqlite')
+
+    def _total_size(self, cache):
+        connection = cache._connect()
+        tracked = connection.execute("SELECT value FROM stats WHERE name = 'total_size'").fetchone()[0]
+        actual = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        self.assertEqual(tracked, actual)
+        return tracked
+
+    def test_total_size_follows_writes_of_all_instances(self):
+        cache = SharedCache(self.path)
+        other_worker = SharedCache(self.path)
+        cache.set('a', b'x' * 10)
+        other_worker.set('b', b'x' * 5)
+        cache.set('a', b'x' * 3)
+        self.assertEqual(self._total_size(cache), 8)
+        other_worker.delete('a')
+        other_worker.delete('missing')
+        self.assertEqual(self._total_size(cache), 5)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = SharedCache(self.path, max_bytes=25)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, b'x' * 10)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), b'x' * 10)
+        self.assertEqual(self._total_size(cache), 20)
+
+    def test_expired_entries_are_evicted_first(self):
+        cache = SharedCache(self.path, max_bytes=25)
+        cache.set('a', b'x' * 10)
+        cache.set('expired', b'x' * 10, ttl=-1)
+        cache.set('c', b'x' * 10)
+        self.assertEqual(cache.get('a'), b'x' * 10)
+        self.assertEqual(self._total_size(cache), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
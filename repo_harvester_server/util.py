@@ -5,6 +5,12 @@ import typing
 from repo_harvester_server import type_util
 
 
+# klass -> compiled deserializer, filled on first use of each type
+_deserializers = {}
+# model class -> tuple of (attribute name, json key, attribute type)
+_model_fields = {}
+
+
 def _deserialize(data, klass):
     """Deserializes dict, list, str into an object.
 
@@ -16,21 +22,38 @@ def _deserialize(data, klass):
     if data is None:
         return None
 
+    deserializer = _deserializers.get(klass)
+    if deserializer is None:
+        deserializer = _deserializers[klass] = _compile_deserializer(klass)
+    return deserializer(data)
+
+
+def _compile_deserializer(klass):
+    """Resolves the per-type branching of _deserialize once for klass.
+
+    :param klass: class literal.
+
+    :return: function deserializing a non None value of klass.
+    """
     if klass in six.integer_types or klass in (float, str, bool, bytearray):
-        return _deserialize_primitive(data, klass)
+        return lambda data: _deserialize_primitive(data, klass)
     elif klass == object:
-        return _deserialize_object(data)
+        return _deserialize_object
     elif klass == datetime.date:
-        return deserialize_date(data)
+        return deserialize_date
     elif klass == datetime.datetime:
-        return deserialize_datetime(data)
+        return deserialize_datetime
     elif type_util.is_generic(klass):
+        if not hasattr(klass, '__args__'):
+            # bare typing.Dict / typing.List: keep the value as it is
+            return _deserialize_object
         if type_util.is_list(klass):
-            return _deserialize_list(data, klass.__args__[0])
+            return lambda data: _deserialize_list(data, klass.__args__[0])
         if type_util.is_dict(klass):
-            return _deserialize_dict(data, klass.__args__[1])
+            return lambda data: _deserialize_dict(data, klass.__args__[1])
+        return lambda data: None
     else:
-        return deserialize_model(data, klass)
+        return lambda data: deserialize_model(data, klass)
 
 
 def _deserialize_primitive(data, klass):
@@ -99,17 +122,20 @@ def deserialize_model(data, klass):
     :param klass: class literal.
     :return: model object.
     """
+    fields = _model_fields.get(klass)
     instance = klass()
+    if fields is None:
+        fields = _model_fields[klass] = tuple(
+            (attr, instance.attribute_map[attr], attr_type)
+            for attr, attr_type in six.iteritems(instance.swagger_types))
 
-    if not instance.swagger_types:
+    if not fields:
         return data
 
-    for attr, attr_type in six.iteritems(instance.swagger_types):
-        if data is not None \
-                and instance.attribute_map[attr] in data \
-                and isinstance(data, (list, dict)):
-            value = data[instance.attribute_map[attr]]
-            setattr(instance, attr, _deserialize(value, attr_type))
+    if data is not None and isinstance(data, (list, dict)):
+        for attr, key, attr_type in fields:
+            if key in data:
+                setattr(instance, attr, _deserialize(data[key], attr_type))
 
     return instance
 